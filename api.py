@@ -1,19 +1,184 @@
+import asyncio
 import base64
-import requests
+import httpx
+import logging
+import json
+import multiprocessing
+import random
+import re
 
-from fastapi import FastAPI, HTTPException
-from PIL import Image, PngImagePlugin
-from time import time_ns
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from io import BytesIO
+from itertools import islice
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable
+from fastapi.concurrency import run_in_threadpool
+from time import perf_counter, time
 from pydantic import BaseModel
 
+from backend.batching import RequestBatcher
+from backend.cache import CachedResponse, ResponseCache, SingleFlight, payload_key
+from backend.client import BackendClient
+from backend.dispatcher import BackendDispatcher
+from backend.streaming import read_images
+from config import settings
+from jobs.bounded import async_bounded_as_completed
+from jobs.queue import Job, JobQueue, JobQueueFull, JobStatus
+from metrics.instruments import (
+    BACKEND_IN_FLIGHT,
+    ERRORS,
+    REGISTRY,
+    RESPONSE_CACHE,
+    record,
+    timed,
+)
+from metrics.middleware import RequestMetricsMiddleware
 from payload.base import Payload
 from payload.templates import img2img
 from payload.controlnet import ControlNetArgs
-from qrgen.generator import QRCodeGenerator
+from payload.sweep import expand_grid, parameter_values
+from qrgen.bulk import INPUT_FORMATS, BulkArchive, aiter_results, parse_items
+from qrgen.cache import LRUCache
+from qrgen.encoding import IMAGE_FORMATS, ImageEncoder
+from qrgen.palette import Palette
+from qrgen.pool import RenderPool
+from qrgen.verify import verify_images
+from qrgen.warmup import warm_up
+from storage.archive import ARCHIVE_FORMATS
+from storage.contact_sheet import make_contact_sheet, make_thumbnail
+from storage.store import OutputRecord, OutputStore, StoredImage
+from storage.writer import OutputWriter
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The heavy imports and a first render run in a thread while the backends
+    # are connected, startup only completes once both are done
+    warm_up_task = None
+    if settings.warm_up:
+        warm_up_task = asyncio.ensure_future(
+            run_in_threadpool(
+                warm_up,
+                control_image_encoder,
+                [TILE_PALETTE, BRIGHTNESS_PALETTE],
+                scan=True,
+            )
+        )
+    # One keep-alive connection pool per backend for the whole app
+    app.state.backend = BackendDispatcher(
+        [
+            BackendClient(
+                base_url=url,
+                connect_timeout=settings.backend_connect_timeout,
+                read_timeout=settings.backend_read_timeout,
+                max_connections=settings.backend_max_connections,
+                max_concurrency=settings.backend_max_concurrency,
+            )
+            for url in settings.backend_urls
+        ],
+        health_path=settings.backend_health_path,
+        health_interval=settings.backend_health_interval,
+        max_failures=settings.backend_max_failures,
+        ejection_time=settings.backend_ejection_time,
+    )
+    await app.state.backend.start()
+    app.state.batcher = None
+    if settings.batch_window > 0:
+        app.state.batcher = RequestBatcher(
+            app.state.backend,
+            window=settings.batch_window,
+            max_batch_size=settings.batch_max_size,
+        )
+    app.state.jobs = JobQueue(
+        handler=run_job,
+        max_size=settings.job_queue_size,
+        workers=settings.job_workers,
+        result_ttl=settings.job_result_ttl,
+    )
+    await app.state.jobs.start()
+    app.state.store = OutputStore(
+        directory=settings.output_dir, sync_policy=settings.output_sync_policy
+    )
+    app.state.writer = OutputWriter(
+        app.state.store,
+        max_workers=settings.output_writer_workers,
+        max_pending=settings.output_writer_max_pending,
+    )
+    app.state.response_cache = ResponseCache(
+        max_bytes=settings.response_cache_max_bytes,
+        ttl=settings.response_cache_ttl,
+        directory=settings.response_cache_dir,
+        max_disk_bytes=settings.response_cache_max_disk_bytes,
+    )
+    app.state.single_flight = SingleFlight()
+    app.state.render_pool = None
+    if settings.render_workers > 0:
+        app.state.render_pool = RenderPool(
+            workers=settings.render_workers,
+            timeout=settings.render_timeout,
+            encoder=control_image_encoder,
+        )
+        await app.state.render_pool.start()
+    # OpenCV releases the GIL while decoding, threads are enough here
+    app.state.verify_pool = ThreadPoolExecutor(
+        max_workers=settings.verify_workers, thread_name_prefix="scan-verify"
+    )
+    # Spawned rather than forked, the server process already runs threads
+    app.state.bulk_pool = ProcessPoolExecutor(
+        max_workers=settings.bulk_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    if warm_up_task is not None:
+        timings = await warm_up_task
+        logger.info(
+            "Warmed up in %.0f ms (%s)",
+            sum(timings.values()) * 1000,
+            ", ".join(
+                f"{step} {seconds * 1000:.0f} ms" for step, seconds in timings.items()
+            ),
+        )
+    yield
+    await app.state.jobs.stop()
+    if app.state.batcher is not None:
+        await app.state.batcher.close()
+    await app.state.backend.close()
+    await run_in_threadpool(app.state.writer.close)
+    app.state.store.close()
+    app.state.bulk_pool.shutdown(wait=False, cancel_futures=True)
+    app.state.verify_pool.shutdown(wait=False, cancel_futures=True)
+    if app.state.render_pool is not None:
+        app.state.render_pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    RequestMetricsMiddleware, timing_header=settings.metrics_timing_header
+)
+
+
+TILE_PALETTE = Palette(
+    bg_color=(255, 255, 255),
+    quiet_color=(255, 255, 255),
+    module_color=(0, 0, 0),
+    pattern_color=(0, 0, 0),
+)
+BRIGHTNESS_PALETTE = Palette()
+
+control_image_cache = LRUCache(max_bytes=settings.control_image_cache_max_bytes)
+control_image_encoder = ImageEncoder(
+    image_format=settings.control_image_format,
+    compress_level=settings.control_image_compress_level,
+    debug_dir=settings.control_image_debug_dir,
+)
 
 
 class GenerateImageRequest(BaseModel):
@@ -33,71 +198,256 @@ class GenerateImageRequest(BaseModel):
     negative_prompt: str
     seed: int = -1
     subseed: int = 0.0
+    qr_seed: int = 0
+    # Decode every returned image and report whether it still scans, with
+    # min_scannable > 0 checking stops once that many scan
+    verify_scan: bool = False
+    min_scannable: int = 0
 
 
-@app.post("/generate_image")
-def generate_image(request: GenerateImageRequest):
-    qr_code_input = request.qr_code_input
-    transform_amount = request.transform_amount
-    code_scale = request.code_scale
-    qr_version = request.qr_version
-    steps = request.steps
-    enable_hr = request.enable_hr
-    low_vram = request.low_vram
-    n_iter = request.n_iter
-    batch_size = request.batch_size
-    hr_scale = request.hr_scale
-    prompt = request.prompt
-    negative_prompt = request.negative_prompt
-    seed = request.seed
-    subseed = request.subseed
-
-    # Generate QR Code
-    tile_generator = QRCodeGenerator(
-        input_string=qr_code_input,
-        version=qr_version,
-        transform_amount=transform_amount,
-        code_scale=code_scale,
-        bg_color=(255, 255, 255),
-        module_color=(0, 0, 0),
-        pattern_color=(0, 0, 0),
-        quiet_color=(255, 255, 255),
-    )
-    tile_qr_code_image = tile_generator.generate_qr_code()
-    buffered = BytesIO()
-    tile_qr_code_image.save(buffered, format="PNG")
-    tile_qr_code_image.save("tile_qr.png", format="PNG")
-    tile_qr_code_image_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-    brightness_generator = QRCodeGenerator(
-        input_string=qr_code_input,
-        version=qr_version,
-        transform_amount=transform_amount,
-        code_scale=code_scale,
-    )
-    brightness_qr_code_image = brightness_generator.generate_qr_code()
-    buffered = BytesIO()
-    brightness_qr_code_image.save(buffered, format="PNG")
-    brightness_qr_code_image.save("brightness_qr.png", format="PNG")
-    brightness_qr_code_image_base64 = base64.b64encode(buffered.getvalue()).decode(
-        "utf-8"
+class SweepRequest(GenerateImageRequest):
+    # Values per parameter in SWEEP_PARAMETERS, either a list or
+    # {"start", "stop", "num"}. A seed of -1 picks one seed for the whole grid
+    parameters: dict[str, list[float] | dict[str, float]]
+    # 0 uses the concurrency of every backend that is not ejected
+    max_concurrency: int = 0
+    return_images: bool = True
+    contact_sheet: bool = False
+
+
+def _encode_control_images(options: dict) -> tuple[str, str]:
+    from qrgen.generator import QRCodeGenerator
+
+    generator = QRCodeGenerator(**options)
+    tile_qr_code_image, brightness_qr_code_image = generator.generate_qr_codes(
+        [TILE_PALETTE, BRIGHTNESS_PALETTE]
+    )
+    return (
+        control_image_encoder.encode_base64(tile_qr_code_image, "tile_qr"),
+        control_image_encoder.encode_base64(brightness_qr_code_image, "brightness_qr"),
     )
 
+
+async def _render_control_images(options: dict) -> tuple[str, str]:
+    if app.state.render_pool is None:
+        return await run_in_threadpool(_encode_control_images, options)
+    try:
+        return await app.state.render_pool.render(
+            options, {"tile_qr": TILE_PALETTE, "brightness_qr": BRIGHTNESS_PALETTE}
+        )
+    except asyncio.TimeoutError:
+        ERRORS.inc(type="render_timeout")
+        raise HTTPException(
+            status_code=504, detail="Rendering the control images timed out."
+        )
+
+
+async def render_control_images(
+    qr_code_input: str,
+    qr_version: int,
+    transform_amount: int,
+    code_scale: float,
+    qr_seed: int,
+) -> tuple[str, str]:
+    # A qr_seed of -1 renders with fresh randomness and bypasses the cache
+    options = {
+        "input_string": qr_code_input,
+        "version": qr_version,
+        "transform_amount": transform_amount,
+        "code_scale": code_scale,
+        "seed": None if qr_seed == -1 else qr_seed,
+    }
+    if options["seed"] is None:
+        return await _render_control_images(options)
+
+    from qrgen.generator import QRCodeGenerator
+
+    key = (
+        QRCodeGenerator(**options).cache_key([TILE_PALETTE, BRIGHTNESS_PALETTE]),
+        control_image_encoder.key,
+    )
+    images = control_image_cache.get(key)
+    if images is None:
+        images = await _render_control_images(options)
+        control_image_cache.put(key, images)
+    return images
+
+
+async def cancel_on_disconnect(request: Request, awaitable, poll_interval=0.5):
+    # Drops the work, including queued renders, once the client is gone
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected.")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+@app.get("/backends")
+def get_backends():
+    return app.state.backend.status()
+
+
+@app.get("/metrics")
+def get_metrics():
+    for backend in app.state.backend.status():
+        BACKEND_IN_FLIGHT.set(backend["outstanding"], backend=backend["url"])
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/control_image_cache")
+def get_control_image_cache_stats():
+    return control_image_cache.stats()
+
+
+async def geometry_cache_stats(clear: bool = False) -> dict:
+    # Warps run in the render pool workers when there is one, each with its
+    # own geometry cache
+    if app.state.render_pool is not None:
+        return await app.state.render_pool.geometry_cache_stats(clear)
+
+    from qrgen.geometry import geometry_cache
+
+    if clear:
+        geometry_cache.clear()
+    return geometry_cache.stats()
+
+
+@app.get("/geometry_cache")
+async def get_geometry_cache_stats():
+    return await geometry_cache_stats()
+
+
+@app.delete("/geometry_cache")
+async def clear_geometry_cache():
+    return await geometry_cache_stats(clear=True)
+
+
+@app.get("/response_cache")
+def get_response_cache_stats():
+    return {
+        **app.state.response_cache.stats(),
+        "in_flight": app.state.single_flight.in_flight,
+        "shared": app.state.single_flight.shared,
+    }
+
+
+@app.delete("/response_cache")
+def clear_response_cache():
+    app.state.response_cache.clear()
+    return get_response_cache_stats()
+
+
+def _image_seeds(info: str) -> list[int]:
+    try:
+        seeds = json.loads(info).get("all_seeds")
+    except (AttributeError, ValueError):
+        return []
+    return seeds if isinstance(seeds, list) else []
+
+
+def save_images(
+    images: list[BinaryIO],
+    info: str,
+    request: GenerateImageRequest,
+    parameters: dict | None = None,
+) -> list[str]:
+    # Stored as the backend sent them plus the parameters chunk, identical
+    # images share one file
+    seeds = _image_seeds(info)
+    request_parameters = request.model_dump(warnings=False)
+    if parameters:
+        request_parameters["sweep_point"] = parameters
+
+    image_ids = []
+    for position, image in enumerate(images):
+        seed = seeds[position] if position < len(seeds) else None
+        if seed is None and request.seed != -1:
+            seed = request.seed
+        record = OutputRecord(
+            prompt=request.prompt,
+            negative_prompt=request.negative_prompt,
+            seed=seed,
+            parameters=request_parameters,
+            info=info,
+            position=position,
+        )
+        image_ids.append(app.state.writer.submit(image.read(), record))
+        image.seek(0)
+    return image_ids
+
+
+def verify_scans(images: list[BinaryIO], expected: str, required: int) -> list[dict]:
+    data = []
+    for image in images:
+        data.append(image.read())
+        image.seek(0)
+
+    results = verify_images(data, expected, app.state.verify_pool, required)
+    return [
+        (
+            {"index": index, "checked": False}
+            if result is None
+            else {"index": index, "checked": True, **result.as_dict()}
+        )
+        for index, result in enumerate(results)
+    ]
+
+
+@asynccontextmanager
+async def open_backend_response(path: str, payload: Payload, body: bytes):
+    # Coalesce compatible requests into one backend call when batching is on,
+    # otherwise stream the already serialized body so images can be decoded
+    # as they arrive
+    if app.state.batcher is not None:
+        yield await app.state.batcher.post(path, payload.get())
+        return
+    async with app.state.backend.stream(path, content=body) as response:
+        yield response
+
+
+# ControlNet settings a sweep can vary, with the values generate uses
+CONTROLNET_DEFAULTS = {
+    "tile_weight": 0.67,
+    "tile_guidance_start": 0.23,
+    "tile_guidance_end": 0.9,
+    "brightness_weight": 0.3,
+    "brightness_guidance_start": 0.5,
+    "brightness_guidance_end": 0.9,
+}
+
+
+def build_payload(
+    request: GenerateImageRequest,
+    tile_qr_code_image_base64: str,
+    brightness_qr_code_image_base64: str,
+    parameters: dict | None = None,
+) -> Payload:
+    # parameters overrides steps, denoising_strength and CONTROLNET_DEFAULTS
+    parameters = {**CONTROLNET_DEFAULTS, **(parameters or {})}
     img2img_overwrites = {
         "init_images": [tile_qr_code_image_base64],
-        "steps": steps,
+        "steps": parameters.get("steps", request.steps),
         "width": 768,
         "height": 768,
-        "low_vram": low_vram,
-        "n_iter": n_iter,
-        "batch_size": batch_size,
-        "seed": seed,
-        "subseed": subseed,
+        "low_vram": request.low_vram,
+        "n_iter": request.n_iter,
+        "batch_size": request.batch_size,
+        "seed": request.seed,
+        "subseed": request.subseed,
     }
+    if "denoising_strength" in parameters:
+        img2img_overwrites["denoising_strength"] = parameters["denoising_strength"]
     payload = Payload(template=img2img, overwrites=img2img_overwrites)
 
-    payload.prompt = prompt
-    payload.negative_prompt = negative_prompt
+    payload.prompt = request.prompt
+    payload.negative_prompt = request.negative_prompt
 
     # Prepare payload
     # payload = PayloadImg2Img(
@@ -123,19 +473,19 @@ def generate_image(request: GenerateImageRequest):
         ControlNetArgs(
             model="control_v11f1e_sd15_tile [a371b31b]",
             module="tile_resample",
-            weight=0.67,
+            weight=parameters["tile_weight"],
             pixel_perfect=True,
-            guidance_start=0.23,
-            guidance_end=0.9,
+            guidance_start=parameters["tile_guidance_start"],
+            guidance_end=parameters["tile_guidance_end"],
             input_image=tile_qr_code_image_base64,
         ),
         ControlNetArgs(
             model="control_v1p_sd15_brightness [5f6aa6ed]",
             module=None,
-            weight=0.3,
+            weight=parameters["brightness_weight"],
             pixel_perfect=True,
-            guidance_start=0.5,
-            guidance_end=0.9,
+            guidance_start=parameters["brightness_guidance_start"],
+            guidance_end=parameters["brightness_guidance_end"],
             input_image=brightness_qr_code_image_base64,
         ),
     ]
@@ -144,34 +494,124 @@ def generate_image(request: GenerateImageRequest):
     for controlnet in controlnets:
         payload.add_controlnet(controlnet)
 
-    # Send payload to API
-    API_URL = "http://localhost:7860"
-    response = requests.post(f"{API_URL}/sdapi/v1/img2img", json=payload.get())
+    return payload
 
-    # Save response images
-    if response.status_code == 200:
-        images = response.json()["images"]
 
-        for image in images[: n_iter * batch_size]:
-            output_image = Image.open(BytesIO(base64.b64decode(image)))
+async def send_payload(payload: Payload, limit: int) -> tuple[list[BinaryIO], str]:
+    with timed("payload_serialize"):
+        body = payload.to_json()
 
-            metadata = PngImagePlugin.PngInfo()
-            metadata.add_text("parameters", response.json()["info"])
+    # A fixed seed always renders the same images, so those are served from
+    # the cache and identical requests in flight share one backend call
+    if payload.seed == -1:
+        return await call_backend("/sdapi/v1/img2img", payload, body, limit)
 
-            filename = "".join(
-                [c for c in prompt if c.isalpha() or c.isdigit() or c == " "]
-            ).strip()[:80]
+    key = payload_key("/sdapi/v1/img2img", body)
+    cached = await app.state.single_flight.run(
+        key,
+        lambda: call_backend_cached(key, "/sdapi/v1/img2img", payload, body, limit),
+    )
+    return [BytesIO(image) for image in cached.images], cached.info
 
-            buffered = BytesIO()
-            output_image.save(buffered, format="PNG")
-            output_image.save(
-                f"./output/{time_ns() // 100000000} {filename}.png", pnginfo=metadata
-            )
-            # output_image_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
 
-        return {"success": True}
+async def collect_result(
+    request: GenerateImageRequest,
+    images: list[BinaryIO],
+    info: str,
+    return_images: bool = False,
+    parameters: dict | None = None,
+) -> dict:
+    try:
+        image_ids = await run_in_threadpool(
+            save_images, images, info, request, parameters
+        )
+        result = {"info": info, "image_ids": image_ids}
+        if request.verify_scan:
+            with timed("scan_verify"):
+                result["scans"] = await run_in_threadpool(
+                    verify_scans, images, request.qr_code_input, request.min_scannable
+                )
+        if return_images:
+            result["images"] = [
+                base64.b64encode(image.read()).decode("utf-8") for image in images
+            ]
+    finally:
+        for image in images:
+            image.close()
+
+    return result
+
+
+async def generate(
+    request: GenerateImageRequest,
+    on_progress: Callable[[float], None] | None = None,
+    return_images: bool = False,
+) -> dict:
+    # Generate QR Codes
+    (
+        tile_qr_code_image_base64,
+        brightness_qr_code_image_base64,
+    ) = await render_control_images(
+        request.qr_code_input,
+        request.qr_version,
+        request.transform_amount,
+        request.code_scale,
+        request.qr_seed,
+    )
+    if on_progress:
+        on_progress(0.1)
+
+    payload_build_start = perf_counter()
+    payload = build_payload(
+        request, tile_qr_code_image_base64, brightness_qr_code_image_base64
+    )
+    record("payload_build", perf_counter() - payload_build_start)
+
+    # Send payload to API
+    if on_progress:
+        on_progress(0.2)
+    images, info = await send_payload(payload, request.n_iter * request.batch_size)
+
+    if on_progress:
+        on_progress(0.9)
+    return await collect_result(request, images, info, return_images)
+
+
+async def call_backend(
+    path: str, payload: Payload, body: bytes, limit: int
+) -> tuple[list[BinaryIO], str]:
+    try:
+        async with open_backend_response(path, payload, body) as response:
+            if response.status_code == 200:
+                images, fields = await read_images(
+                    response,
+                    limit=limit,
+                    spool_size=settings.image_spool_size,
+                )
+            else:
+                await response.aread()
+    except httpx.TimeoutException:
+        ERRORS.inc(type="backend_timeout")
+        raise HTTPException(status_code=504, detail="Backend timed out.")
+    except httpx.HTTPError as e:
+        ERRORS.inc(type="backend_unreachable")
+        raise HTTPException(status_code=502, detail=f"Backend unreachable: {e}")
+    except ValueError as e:
+        ERRORS.inc(type="invalid_response")
+        raise HTTPException(status_code=502, detail=f"Invalid backend response: {e}")
+
+    if response.status_code == 200:
+        if "info" not in fields:
+            for image in images:
+                image.close()
+            ERRORS.inc(type="invalid_response")
+            raise HTTPException(
+                status_code=502, detail="Invalid backend response: missing info."
+            )
+        return images, fields["info"]
 
     else:
+        ERRORS.inc(type=f"backend_status_{response.status_code}")
         if response.text:
             raise HTTPException(status_code=500, detail=response.text)
         if response.json()["errors"]:
@@ -184,6 +624,304 @@ def generate_image(request: GenerateImageRequest):
             )
 
 
+async def call_backend_cached(
+    key: str, path: str, payload: Payload, body: bytes, limit: int
+) -> CachedResponse:
+    cached = await run_in_threadpool(app.state.response_cache.get, key)
+    if cached is not None:
+        RESPONSE_CACHE.inc(result="hit")
+        return cached
+
+    RESPONSE_CACHE.inc(result="miss")
+    images, info = await call_backend(path, payload, body, limit)
+    try:
+        cached = CachedResponse(tuple(image.read() for image in images), info, time())
+    finally:
+        for image in images:
+            image.close()
+    await run_in_threadpool(app.state.response_cache.put, key, cached)
+    return cached
+
+
+async def run_job(job: Job) -> dict:
+    def on_progress(progress: float) -> None:
+        job.progress = progress
+
+    return await generate(job.request, on_progress=on_progress, return_images=True)
+
+
+@app.post("/generate_image")
+async def generate_image(request: GenerateImageRequest, http_request: Request):
+    result = await cancel_on_disconnect(http_request, generate(request))
+    if "scans" in result:
+        return {
+            "success": True,
+            "image_ids": result["image_ids"],
+            "scans": result["scans"],
+        }
+    return {"success": True, "image_ids": result["image_ids"]}
+
+
+def _job_status(job: Job) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "position": app.state.jobs.position(job),
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _get_job(job_id: str) -> Job:
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: GenerateImageRequest):
+    try:
+        job = app.state.jobs.submit(request)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return _job_status(job)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    return _job_status(_get_job(job_id))
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = _get_job(job_id)
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail="Job has not finished yet.")
+    return {"job_id": job.id, **job.result}
+
+
+IMAGE_ID = re.compile(r"[0-9a-f]{64}")
+
+
+@app.get("/images")
+async def list_images(
+    prompt: str | None = None,
+    seed: int | None = None,
+    before: int | None = None,
+    limit: int = 50,
+):
+    # Newest outputs first, pass next as before to get the following page
+    limit = max(1, min(limit, 200))
+    outputs = await run_in_threadpool(
+        app.state.store.outputs, None, prompt, seed, before, limit
+    )
+    next_before = outputs[-1]["id"] if len(outputs) == limit else None
+    return {"outputs": outputs, "next": next_before}
+
+
+async def _get_stored_image(image_id: str) -> StoredImage:
+    if not IMAGE_ID.fullmatch(image_id):
+        raise HTTPException(status_code=404, detail="Unknown image.")
+    # Ids are handed out before the background write finishes
+    future = app.state.writer.in_flight(image_id)
+    if future is not None:
+        await asyncio.gather(asyncio.wrap_future(future), return_exceptions=True)
+    image = await run_in_threadpool(app.state.store.get, image_id)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Unknown image.")
+    return image
+
+
+@app.api_route("/images/{image_id}", methods=["GET", "HEAD"])
+async def get_image(image_id: str, request: Request):
+    image = await _get_stored_image(image_id)
+    # The id is the content hash, so the ETag never changes
+    etag = f'"{image.id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+    # FileResponse answers Range and If-Range requests itself
+    return FileResponse(image.path, media_type=image.media_type, headers=headers)
+
+
+@app.get("/images/{image_id}/outputs")
+async def get_image_outputs(image_id: str):
+    image = await _get_stored_image(image_id)
+    return await run_in_threadpool(app.state.store.outputs, image.id)
+
+
+def _sweep_capacity() -> int:
+    backends = [b for b in app.state.backend.status() if not b["ejected"]]
+    return max(1, len(backends) * settings.backend_max_concurrency)
+
+
+async def run_sweep_point(
+    request: SweepRequest,
+    control_images: tuple[str, str],
+    index: int,
+    parameters: dict,
+) -> dict:
+    line = {"index": index, "parameters": parameters}
+    try:
+        payload = build_payload(request, *control_images, parameters)
+        images, info = await send_payload(payload, request.n_iter * request.batch_size)
+        # Images are always read back here, the contact sheet needs them too
+        line.update(
+            await collect_result(
+                request, images, info, return_images=True, parameters=parameters
+            )
+        )
+    except HTTPException as e:
+        line["error"] = e.detail
+    except Exception as e:
+        # One failed point shouldn't end the stream for the others
+        line["error"] = f"{type(e).__name__}: {e}"
+    return line
+
+
+async def iter_sweep(
+    request: SweepRequest,
+    control_images: tuple[str, str],
+    points: list[dict],
+    max_in_flight: int,
+) -> AsyncIterator[dict]:
+    # Yields one line per grid point as it finishes, keeping at most
+    # max_in_flight points at the backends
+    def submit(point: tuple[int, dict]) -> Awaitable[dict]:
+        return run_sweep_point(request, control_images, *point)
+
+    async for _, task in async_bounded_as_completed(
+        enumerate(points), submit, max_in_flight
+    ):
+        yield task.result()
+
+
+@app.post("/sweep")
+async def sweep(request: SweepRequest):
+    # Renders the control images once and streams one JSON line per grid
+    # point as it finishes, then the contact sheet when requested
+    try:
+        points = expand_grid(request.parameters, settings.sweep_max_points)
+        # Contact sheet rows follow the last parameter
+        columns = 1
+        if request.parameters:
+            name = list(request.parameters)[-1]
+            columns = len(
+                parameter_values(
+                    name, request.parameters[name], settings.sweep_max_points
+                )
+            )
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sweep: {e}")
+    if request.seed == -1:
+        request = request.model_copy(update={"seed": random.randrange(2**32)})
+
+    control_images = await render_control_images(
+        request.qr_code_input,
+        request.qr_version,
+        request.transform_amount,
+        request.code_scale,
+        request.qr_seed,
+    )
+    max_in_flight = _sweep_capacity()
+    if request.max_concurrency > 0:
+        max_in_flight = min(max_in_flight, request.max_concurrency)
+
+    async def stream():
+        yield json.dumps(
+            {"points": len(points), "seed": request.seed, "concurrency": max_in_flight}
+        ) + "\n"
+
+        thumbnails = [None] * len(points)
+        async for line in iter_sweep(request, control_images, points, max_in_flight):
+            images = line.get("images") or []
+            if request.contact_sheet and images:
+                thumbnails[line["index"]] = await run_in_threadpool(
+                    make_thumbnail,
+                    base64.b64decode(images[0]),
+                    settings.sweep_thumbnail_size,
+                )
+            if not request.return_images:
+                line.pop("images", None)
+            yield json.dumps(line) + "\n"
+
+        if request.contact_sheet:
+            labels = [
+                "\n".join(f"{name}={value}" for name, value in point.items())
+                for point in points
+            ]
+            sheet = await run_in_threadpool(
+                make_contact_sheet,
+                thumbnails,
+                labels,
+                columns,
+                settings.sweep_thumbnail_size,
+            )
+            yield json.dumps(
+                {"contact_sheet": base64.b64encode(sheet).decode("utf-8")}
+            ) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/qr_codes/bulk")
+async def bulk_qr_codes(
+    request: Request,
+    input_format: str = "jsonl",
+    archive_format: str = "zip",
+    image_format: str = "png",
+    compress_level: int = 1,
+):
+    # Body is JSONL or CSV with one code per line, the archive is streamed
+    # as codes finish rendering
+    if input_format not in INPUT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unknown input format.")
+    if archive_format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail="Unknown archive format.")
+    if image_format not in IMAGE_FORMATS or not 0 <= compress_level <= 9:
+        raise HTTPException(status_code=400, detail="Unknown image encoding.")
+
+    try:
+        data = (await request.body()).decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body has to be UTF-8.")
+    items = list(islice(parse_items(data, input_format), settings.bulk_max_items + 1))
+    if len(items) > settings.bulk_max_items:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.bulk_max_items} items."
+        )
+
+    archive = BulkArchive(archive_format, image_format)
+
+    async def stream():
+        async for result in aiter_results(
+            items,
+            app.state.bulk_pool,
+            image_format=image_format,
+            compress_level=compress_level,
+            max_in_flight=settings.bulk_workers * 2,
+        ):
+            yield archive.add(result)
+        yield archive.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type=archive.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="qr_codes.{archive_format}"'
+        },
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
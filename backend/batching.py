@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+
+from typing import Dict, List, Set
+
+import httpx
+
+from backend.client import BackendClient
+
+# Fields that may differ between requests sharing one backend call
+BATCH_FIELDS = ("batch_size", "n_iter")
+# Per-image lists in the backend's info that have to be split per request
+INFO_LIST_FIELDS = (
+    "all_prompts",
+    "all_negative_prompts",
+    "all_seeds",
+    "all_subseeds",
+    "infotexts",
+)
+
+
+class _Batch:
+    def __init__(self, path: str, payload: Dict) -> None:
+        self.path = path
+        self.payload = dict(payload)
+        self.counts: List[int] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: asyncio.TimerHandle | None = None
+
+    @property
+    def size(self) -> int:
+        return sum(self.counts)
+
+
+class RequestBatcher:
+    def __init__(
+        self, backend: BackendClient, window: float = 0.2, max_batch_size: int = 8
+    ) -> None:
+        self.backend = backend
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._batches: Dict[str, _Batch] = {}
+        # The loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _batch_key(self, path: str, payload: Dict) -> str:
+        shared = {k: v for k, v in payload.items() if k not in BATCH_FIELDS}
+        encoded = json.dumps([path, shared], sort_keys=True).encode("utf-8")
+        return hashlib.sha1(encoded).hexdigest()
+
+    async def post(self, path: str, payload: Dict) -> httpx.Response:
+        count = payload.get("batch_size", 1) * payload.get("n_iter", 1)
+
+        # A fixed seed pins the images to the request, merging it into a
+        # larger batch would shift its seeds
+        if payload.get("seed", -1) != -1 or count >= self.max_batch_size:
+            return await self.backend.post(path, json=payload)
+
+        key = self._batch_key(path, payload)
+        batch = self._batches.get(key)
+        if batch is not None and batch.size + count > self.max_batch_size:
+            self._flush(key)
+            batch = None
+        if batch is None:
+            batch = self._batches[key] = _Batch(path, payload)
+            batch.timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush, key
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        batch.counts.append(count)
+        batch.futures.append(future)
+        if batch.size >= self.max_batch_size:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key: str) -> None:
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        # Batches still waiting for their window and calls in flight are
+        # cancelled, their callers see CancelledError
+        for batch in self._batches.values():
+            batch.timer.cancel()
+            for future in batch.futures:
+                future.cancel()
+        self._batches.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _send(self, batch: _Batch) -> None:
+        if len(batch.futures) == 1:
+            payload = batch.payload
+        else:
+            payload = {**batch.payload, "batch_size": batch.size, "n_iter": 1}
+
+        try:
+            response = await self.backend.post(batch.path, json=payload)
+        except asyncio.CancelledError:
+            for future in batch.futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(batch.futures) == 1 or response.status_code != 200:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_result(response)
+            return
+
+        response_json = response.json()
+        images = response_json["images"]
+        offset = 0
+        for count, future in zip(batch.counts, batch.futures):
+            if not future.done():
+                future.set_result(
+                    httpx.Response(
+                        200,
+                        json={
+                            **response_json,
+                            "images": images[offset : offset + count],
+                            "info": _split_info(response_json["info"], offset, count),
+                        },
+                    )
+                )
+            offset += count
+
+
+def _split_info(info: str, offset: int, count: int) -> str:
+    try:
+        data = json.loads(info)
+    except (TypeError, ValueError):
+        return info
+
+    for field in INFO_LIST_FIELDS:
+        if isinstance(data.get(field), list):
+            data[field] = data[field][offset : offset + count]
+    if data.get("all_seeds"):
+        data["seed"] = data["all_seeds"][0]
+    if data.get("all_subseeds"):
+        data["subseed"] = data["all_subseeds"][0]
+    if data.get("all_prompts"):
+        data["prompt"] = data["all_prompts"][0]
+    data["batch_size"] = count
+    data["index_of_first_image"] = 0
+
+    return json.dumps(data)
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Tuple
+
+from qrgen.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    images: Tuple[bytes, ...]
+    info: str
+    created_at: float
+
+    @property
+    def size(self) -> int:
+        return sum(len(image) for image in self.images) + len(self.info)
+
+
+def payload_key(path: str, body: bytes) -> str:
+    # Payloads are serialized in template order, so the same request always
+    # gives the same body
+    return hashlib.sha256(path.encode("utf-8") + b"\n" + body).hexdigest()
+
+
+class ResponseCache:
+    # Backend responses by payload key, bounded by size and age. With a
+    # directory set, entries are also written there and survive restarts
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600.0,
+        directory: str | None = None,
+        max_disk_bytes: int = 2 * 1024 * 1024 * 1024,
+    ) -> None:
+        self.ttl = ttl
+        self.directory = directory or None
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = LRUCache(max_bytes, size_of=lambda entry: entry.size)
+        # File size and creation time per key, oldest first
+        self._disk_entries: OrderedDict[str, Tuple[int, float]] = OrderedDict()
+        self._lock = Lock()
+        if self.directory is not None:
+            self._scan_directory()
+
+    def _expired(self, created_at: float) -> bool:
+        return time() - created_at > self.ttl
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.bin")
+
+    def _scan_directory(self) -> None:
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if not file.endswith(".bin"):
+                    continue
+                stat = os.stat(os.path.join(root, file))
+                found.append((stat.st_mtime, file[:-4], stat.st_size))
+        for created_at, key, size in sorted(found):
+            self._disk_entries[key] = (size, created_at)
+            self.disk_size += size
+
+    def get(self, key: str) -> CachedResponse | None:
+        # Blocking when a directory is set, call from a thread
+        entry = self._memory.get(key)
+        with self._lock:
+            if entry is not None and self._expired(entry.created_at):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self.hits += 1
+                return entry
+            on_disk = key in self._disk_entries
+
+        entry = self._load(key) if on_disk else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory.put(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        self._memory.put(key, entry)
+        if self.directory is not None:
+            self._store(key, entry)
+
+    def _remove(self, key: str) -> None:
+        self._memory.pop(key)
+        disk_entry = self._disk_entries.pop(key, None)
+        if disk_entry is not None:
+            self.disk_size -= disk_entry[0]
+            self._unlink(key)
+
+    def _unlink(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _load(self, key: str) -> CachedResponse | None:
+        # One JSON header line with the info and image sizes, then the images
+        try:
+            with open(self._path(key), "rb") as f:
+                header = json.loads(f.readline())
+                images = tuple(f.read(size) for size in header["sizes"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Dropping unreadable cache entry %s: %s", key, e)
+            with self._lock:
+                self._remove(key)
+            return None
+
+        entry = CachedResponse(images, header["info"], header["created_at"])
+        if self._expired(entry.created_at):
+            with self._lock:
+                self._remove(key)
+            return None
+        return entry
+
+    def _store(self, key: str, entry: CachedResponse) -> None:
+        path = self._path(key)
+        header = {
+            "info": entry.info,
+            "created_at": entry.created_at,
+            "sizes": [len(image) for image in entry.images],
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file first so readers never see half an
+            # entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                for image in entry.images:
+                    f.write(image)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write cache entry %s: %s", key, e)
+            return
+
+        with self._lock:
+            previous = self._disk_entries.pop(key, None)
+            if previous is not None:
+                self.disk_size -= previous[0]
+            self._disk_entries[key] = (size, entry.created_at)
+            self.disk_size += size
+
+            # Oldest entries go first, they are also the first to expire
+            evicted = []
+            while self.disk_size > self.max_disk_bytes:
+                evicted_key, (evicted_size, _) = self._disk_entries.popitem(last=False)
+                self.disk_size -= evicted_size
+                evicted.append(evicted_key)
+        for evicted_key in evicted:
+            self._unlink(evicted_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._disk_entries)
+            self._memory.clear()
+            self._disk_entries.clear()
+            self.disk_size = 0
+        for key in keys:
+            self._unlink(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "size": self._memory.size,
+                "max_bytes": self._memory.max_bytes,
+                "disk_entries": len(self._disk_entries),
+                "disk_size": self.disk_size,
+                "max_disk_bytes": self.max_disk_bytes,
+            }
+
+
+class SingleFlight:
+    # Identical calls made while one is in flight share its result instead
+    # of starting their own. The call is cancelled once nobody waits for it
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.shared = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: str, func: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.shared += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if self._waiters[task] == 0:
+                # Dropped here, the finished task holds the response
+                del self._waiters[task]
+                if not task.done():
+                    # Later callers start a fresh call rather than join this one
+                    self._forget(key, task)
+                    task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if task.done() and not task.cancelled():
+            # Marks the exception as retrieved when every waiter left early
+            task.exception()
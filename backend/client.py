@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import AsyncIterator
+
+import httpx
+
+from metrics.instruments import record, timed
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def encode_json(data: dict) -> bytes:
+    # Same encoding httpx uses for json=, done here so it can be timed
+    with timed("payload_serialize"):
+        return json.dumps(
+            data, ensure_ascii=False, separators=(",", ":"), allow_nan=False
+        ).encode("utf-8")
+
+
+class BackendClient:
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 300.0,
+        max_connections: int = 16,
+        max_concurrency: int = 2,
+    ) -> None:
+        self.base_url = base_url
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(
+                connect=connect_timeout,
+                read=read_timeout,
+                write=read_timeout,
+                pool=None,
+            ),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        # Caps the number of jobs we hand to the GPU at the same time, the
+        # rest wait here without holding a connection
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def post(
+        self, path: str, json: dict | None = None, content: bytes | None = None
+    ) -> httpx.Response:
+        # content is an already serialized JSON body
+        if content is None:
+            content = encode_json(json)
+        with timed("backend_queue"):
+            await self.semaphore.acquire()
+        try:
+            with timed("backend_roundtrip"):
+                return await self.client.post(
+                    path, content=content, headers=JSON_HEADERS
+                )
+        finally:
+            self.semaphore.release()
+
+    @asynccontextmanager
+    async def stream(
+        self, path: str, json: dict | None = None, content: bytes | None = None
+    ) -> AsyncIterator[httpx.Response]:
+        # Like post, but the body is left unread for incremental parsing
+        # Round-trip ends with the response headers, reading the body is
+        # timed by the caller
+        if content is None:
+            content = encode_json(json)
+        with timed("backend_queue"):
+            await self.semaphore.acquire()
+        try:
+            start = perf_counter()
+            async with self.client.stream(
+                "POST", path, content=content, headers=JSON_HEADERS
+            ) as response:
+                record("backend_roundtrip", perf_counter() - start)
+                yield response
+        finally:
+            self.semaphore.release()
+
+    async def get(self, path: str, timeout: float | None = None) -> httpx.Response:
+        if timeout is None:
+            return await self.client.get(path)
+        return await self.client.get(path, timeout=timeout)
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+
+from contextlib import AsyncExitStack, asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Dict, List, Set
+
+import httpx
+
+from backend.client import BackendClient
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean the backend itself is in trouble, not the request
+FAILOVER_STATUS_CODES = (502, 503, 504)
+
+
+class NoBackendAvailable(httpx.TransportError):
+    pass
+
+
+class Backend:
+    def __init__(self, client: BackendClient) -> None:
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def url(self) -> str:
+        return self.client.base_url
+
+    @property
+    def ejected(self) -> bool:
+        return monotonic() < self.ejected_until
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.ejected
+
+    def status(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": self.ejected,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+        }
+
+
+class BackendDispatcher:
+    def __init__(
+        self,
+        clients: List[BackendClient],
+        health_path: str = "/internal/ping",
+        health_interval: float = 10.0,
+        health_timeout: float = 5.0,
+        max_failures: int = 3,
+        ejection_time: float = 30.0,
+    ) -> None:
+        self.backends = [Backend(client) for client in clients]
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self._health_task = None
+        self._next = 0
+
+    async def start(self) -> None:
+        await self.check_health()
+        self._health_task = asyncio.create_task(self._check_health_periodically())
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+        await asyncio.gather(*(backend.client.close() for backend in self.backends))
+
+    def status(self) -> List[Dict]:
+        return [backend.status() for backend in self.backends]
+
+    def _pick(self, tried: Set[Backend]) -> Backend | None:
+        candidates = [b for b in self.backends if b not in tried and b.available]
+        if not candidates:
+            # Everything looks down, still try the ones that are not ejected
+            candidates = [b for b in self.backends if b not in tried and not b.ejected]
+        if not candidates:
+            return None
+
+        # Least outstanding jobs, rotating the start to spread ties
+        self._next = (self._next + 1) % len(candidates)
+        candidates = candidates[self._next :] + candidates[: self._next]
+        return min(candidates, key=lambda backend: backend.outstanding)
+
+    def _record_failure(self, backend: Backend) -> None:
+        backend.failures += 1
+        if backend.failures >= self.max_failures:
+            logger.warning(
+                "Ejecting backend %s for %ss", backend.url, self.ejection_time
+            )
+            backend.ejected_until = monotonic() + self.ejection_time
+            backend.failures = 0
+
+    def _record_success(self, backend: Backend) -> None:
+        backend.failures = 0
+        backend.healthy = True
+
+    async def post(
+        self, path: str, json: dict | None = None, content: bytes | None = None
+    ) -> httpx.Response:
+        tried: Set[Backend] = set()
+        response = None
+        error = None
+
+        while (backend := self._pick(tried)) is not None:
+            tried.add(backend)
+            backend.outstanding += 1
+            try:
+                response = await backend.client.post(path, json=json, content=content)
+            except httpx.HTTPError as e:
+                logger.warning("Backend %s failed: %r", backend.url, e)
+                self._record_failure(backend)
+                error = e
+                continue
+            finally:
+                backend.outstanding -= 1
+
+            if response.status_code in FAILOVER_STATUS_CODES:
+                self._record_failure(backend)
+                continue
+
+            self._record_success(backend)
+            return response
+
+        if response is not None:
+            return response
+        if error is not None:
+            raise error
+        raise NoBackendAvailable("No backend available.")
+
+    @asynccontextmanager
+    async def stream(
+        self, path: str, json: dict | None = None, content: bytes | None = None
+    ) -> AsyncIterator[httpx.Response]:
+        # Fails over like post until a backend answers, after that the
+        # streamed body belongs to the caller
+        tried: Set[Backend] = set()
+        error = None
+
+        while (backend := self._pick(tried)) is not None:
+            tried.add(backend)
+            backend.outstanding += 1
+            try:
+                async with AsyncExitStack() as stack:
+                    try:
+                        response = await stack.enter_async_context(
+                            backend.client.stream(path, json=json, content=content)
+                        )
+                    except httpx.HTTPError as e:
+                        logger.warning("Backend %s failed: %r", backend.url, e)
+                        self._record_failure(backend)
+                        error = e
+                        continue
+
+                    if response.status_code in FAILOVER_STATUS_CODES:
+                        self._record_failure(backend)
+                        if self._pick(tried) is not None:
+                            continue
+                    else:
+                        self._record_success(backend)
+
+                    yield response
+                    return
+            finally:
+                backend.outstanding -= 1
+
+        if error is not None:
+            raise error
+        raise NoBackendAvailable("No backend available.")
+
+    async def _probe(self, backend: Backend) -> None:
+        try:
+            response = await backend.client.get(
+                self.health_path, timeout=self.health_timeout
+            )
+            backend.healthy = response.status_code == 200
+        except httpx.HTTPError:
+            backend.healthy = False
+
+    async def check_health(self) -> None:
+        await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+
+    async def _check_health_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
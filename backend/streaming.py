@@ -0,0 +1,255 @@
+import base64
+import json
+import re
+
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Tuple
+
+import httpx
+
+from metrics.instruments import record
+
+# Next character that matters while scanning a JSON value / string
+VALUE_TOKEN = re.compile(rb'["\[\]{},]')
+STRING_TOKEN = re.compile(rb'["\\]')
+WHITESPACE = b" \t\r\n"
+
+
+class ImageStreamParser:
+    # Incremental parser for backend responses shaped like
+    # {"images": ["<base64>", ...], "info": "...", ...}. Images are decoded
+    # piece by piece as their base64 arrives, other top level fields are
+    # skipped unless listed in keep_fields.
+
+    def __init__(self, image_field: str = "images", keep_fields=("info",)) -> None:
+        self.image_field = image_field
+        self.keep_fields = keep_fields
+        self.fields: Dict[str, Any] = {}
+        self._buffer = bytearray()
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._value_start = None
+        self._depth = 0
+        self._in_string = False
+        self._pending = b""
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[str, bytes | None]]:
+        # Yields ("start", None), ("data", bytes) and ("end", None) per image
+        self._buffer += chunk
+        yield from self._parse()
+
+        # Drop everything already consumed, except a value being captured
+        keep_from = self._pos if self._value_start is None else self._value_start
+        del self._buffer[:keep_from]
+        self._pos -= keep_from
+        if self._value_start is not None:
+            self._value_start = 0
+
+    def _skip_whitespace(self, separators: bytes = b"") -> bool:
+        buffer = self._buffer
+        while self._pos < len(buffer) and buffer[self._pos] in WHITESPACE + separators:
+            self._pos += 1
+        return self._pos < len(buffer)
+
+    def _parse(self) -> Iterator[Tuple[str, bytes | None]]:
+        buffer = self._buffer
+        while True:
+            if self._state == "start":
+                if not self._skip_whitespace():
+                    return
+                if buffer[self._pos] != ord("{"):
+                    raise ValueError("Expected a JSON object.")
+                self._pos += 1
+                self._state = "key"
+
+            elif self._state == "key":
+                if not self._skip_whitespace(b","):
+                    return
+                if buffer[self._pos] == ord("}"):
+                    self._pos += 1
+                    self._state = "done"
+                    return
+                end, _ = self._find_string_end(self._pos + 1)
+                if end is None:
+                    return
+                self._key = json.loads(buffer[self._pos : end + 1])
+                self._pos = end + 1
+                self._state = "colon"
+
+            elif self._state == "colon":
+                if not self._skip_whitespace():
+                    return
+                if buffer[self._pos] != ord(":"):
+                    raise ValueError("Expected ':' after key.")
+                self._pos += 1
+                self._state = "value"
+
+            elif self._state == "value":
+                if not self._skip_whitespace():
+                    return
+                if self._key == self.image_field and buffer[self._pos] == ord("["):
+                    self._pos += 1
+                    self._state = "images"
+                else:
+                    if self._key in self.keep_fields:
+                        self._value_start = self._pos
+                    self._depth = 0
+                    self._in_string = False
+                    self._state = "skip"
+
+            elif self._state == "skip":
+                end = self._scan_value()
+                if end is None:
+                    return
+                if self._value_start is not None:
+                    value = buffer[self._value_start : end]
+                    self.fields[self._key] = json.loads(value)
+                    self._value_start = None
+                self._state = "key"
+
+            elif self._state == "images":
+                if not self._skip_whitespace(b","):
+                    return
+                if buffer[self._pos] == ord("]"):
+                    self._pos += 1
+                    self._state = "key"
+                    continue
+                if buffer[self._pos] != ord('"'):
+                    raise ValueError("Expected a base64 string in images.")
+                self._pos += 1
+                self._pending = b""
+                self._state = "image"
+                yield "start", None
+
+            elif self._state == "image":
+                match = STRING_TOKEN.search(buffer, self._pos)
+                if match is None:
+                    data = self._pending + buffer[self._pos :]
+                    self._pos = len(buffer)
+                    yield from self._decode(data)
+                    return
+
+                end = match.start()
+                data = self._pending + buffer[self._pos : end]
+                if buffer[end] == ord("\\"):
+                    # Only "\/" can show up in base64, keep the slash
+                    if end + 1 >= len(buffer):
+                        self._pending = data
+                        self._pos = end
+                        return
+                    self._pos = end + 2
+                    yield from self._decode(data + buffer[end + 1 : end + 2])
+                    continue
+
+                self._pos = end + 1
+                if data:
+                    yield "data", base64.b64decode(data)
+                self._pending = b""
+                self._state = "images"
+                yield "end", None
+
+            else:
+                return
+
+    def _decode(self, data: bytes) -> Iterator[Tuple[str, bytes | None]]:
+        # Decode whole base64 quads and keep the rest for the next chunk
+        usable = len(data) // 4 * 4
+        if usable:
+            yield "data", base64.b64decode(data[:usable])
+        self._pending = bytes(data[usable:])
+
+    def _find_string_end(self, pos: int) -> Tuple[int | None, int]:
+        # Returns the closing quote, or None and where to resume scanning
+        buffer = self._buffer
+        while True:
+            match = STRING_TOKEN.search(buffer, pos)
+            if match is None:
+                return None, len(buffer)
+            if buffer[match.start()] == ord('"'):
+                return match.start(), match.start()
+            if match.start() + 1 >= len(buffer):
+                return None, match.start()
+            pos = match.start() + 2
+
+    def _scan_value(self) -> int | None:
+        # Returns the end of the current value once it is complete
+        buffer = self._buffer
+        while True:
+            if self._in_string:
+                end, resume = self._find_string_end(self._pos)
+                if end is None:
+                    # Don't rescan the bulk of long strings on the next chunk
+                    self._pos = resume
+                    return None
+                self._pos = end + 1
+                self._in_string = False
+                if self._depth == 0:
+                    return self._pos
+                continue
+
+            match = VALUE_TOKEN.search(buffer, self._pos)
+            if match is None:
+                self._pos = len(buffer)
+                return None
+            char = buffer[match.start()]
+            if char == ord('"'):
+                self._pos = match.start() + 1
+                self._in_string = True
+            elif char in b"[{":
+                self._pos = match.start() + 1
+                self._depth += 1
+            elif char in b"]}" and self._depth > 0:
+                self._pos = match.start() + 1
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._pos
+            elif self._depth > 0:
+                self._pos = match.start() + 1
+            else:
+                # A "," or the closing "}" ends a scalar at the top level
+                self._pos = match.start()
+                return self._pos
+
+
+async def read_images(
+    response: httpx.Response, limit: int, spool_size: int = 8 * 1024 * 1024
+) -> Tuple[List[SpooledTemporaryFile], Dict[str, Any]]:
+    # Decode the first `limit` images of a response into spooled buffers
+    # without holding the whole body in memory. spool_size is shared by all
+    # images of the response, once it is used up they are written to disk
+    parser = ImageStreamParser()
+    images = []
+    image = None
+    decoded = 0
+    decode_time = 0.0
+    start = perf_counter()
+    async for chunk in response.aiter_bytes():
+        decode_start = perf_counter()
+        for event, data in parser.feed(chunk):
+            if event == "start":
+                image = None
+                if len(images) < limit:
+                    image = SpooledTemporaryFile(max_size=spool_size)
+                    images.append(image)
+            elif event == "data" and image is not None:
+                image.write(data)
+                decoded += len(data)
+                if decoded > spool_size:
+                    image.rollover()
+        decode_time += perf_counter() - decode_start
+
+    # Parse covers the whole body download, decode only the CPU time spent
+    # scanning JSON and decoding base64 between chunks
+    record("response_parse", perf_counter() - start)
+    record("image_decode", decode_time)
+    if not parser.done:
+        raise ValueError("Incomplete backend response.")
+    for image in images:
+        image.seek(0)
+    return images, parser.fields
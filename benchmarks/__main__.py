@@ -0,0 +1,68 @@
+import argparse
+import os
+
+from benchmarks import coldstart, encoding, payload, qrgen
+from benchmarks.common import write_results
+
+QUICK_VERSIONS = [1, 10, 20, 40]
+# Next to the suite, ignored by git
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "benchmark_results.json")
+
+
+def parse_ints(value: str) -> list[int]:
+    # "1-40" or "1,4,10"
+    values = []
+    for part in value.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            values += range(int(start), int(end) + 1)
+        else:
+            values.append(int(part))
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument(
+        "--suites",
+        default="qrgen,encoding,payload",
+        help="comma separated, coldstart is opt-in",
+    )
+    parser.add_argument("--versions", type=parse_ints, default=qrgen.VERSIONS)
+    parser.add_argument("--pixel-sizes", type=parse_ints, default=qrgen.PIXEL_SIZES)
+    parser.add_argument(
+        "--transform-amounts", type=parse_ints, default=qrgen.TRANSFORM_AMOUNTS
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--no-stages", action="store_true", help="only time generate_qr_code"
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help=f"versions {QUICK_VERSIONS} only"
+    )
+    args = parser.parse_args()
+
+    suites = args.suites.split(",")
+    results = []
+    if "qrgen" in suites:
+        results += qrgen.run(
+            versions=QUICK_VERSIONS if args.quick else args.versions,
+            pixel_sizes=args.pixel_sizes,
+            transform_amounts=args.transform_amounts,
+            repeat=args.repeat,
+            stages=not args.no_stages,
+        )
+    if "encoding" in suites:
+        results += encoding.run(repeat=args.repeat)
+    if "payload" in suites:
+        results += payload.run(repeat=args.repeat)
+    if "coldstart" in suites:
+        results += coldstart.run(repeat=args.repeat)
+
+    write_results(args.output, results)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from itertools import product
+from time import perf_counter
+from typing import Dict, List
+
+from benchmarks.common import summarize
+
+# Nothing listens here, the health check fails fast instead of timing out
+UNREACHABLE_BACKEND = "http://127.0.0.1:9"
+STEPS = ("import", "startup", "first_render", "second_render", "ready_to_render")
+WARM_UPS = [False, True]
+RENDER_WORKERS = [0, 2]
+
+
+def probe() -> Dict[str, float]:
+    # Runs in a fresh interpreter: import the app, run its startup and time
+    # the first two control image renders, in milliseconds
+    from fastapi.testclient import TestClient
+
+    start = perf_counter()
+    import api
+
+    timings = {"import": perf_counter() - start}
+
+    start = perf_counter()
+    with TestClient(api.app) as client:
+        timings["startup"] = perf_counter() - start
+        # Different qr seeds so the second render misses the cache too
+        for step, qr_seed in (("first_render", 1), ("second_render", 2)):
+            start = perf_counter()
+            client.portal.call(
+                api.render_control_images, "cold start", 4, 1, 0.85, qr_seed
+            )
+            timings[step] = perf_counter() - start
+
+    timings["ready_to_render"] = timings["startup"] + timings["first_render"]
+    return {step: seconds * 1000 for step, seconds in timings.items()}
+
+
+def _run_probe(warm_up: bool, render_workers: int) -> Dict[str, float]:
+    # Every probe gets its own output directory, removed afterwards
+    with tempfile.TemporaryDirectory() as output_dir:
+        env = {
+            **os.environ,
+            "SD_BACKEND_URL": UNREACHABLE_BACKEND,
+            "WARM_UP": "true" if warm_up else "false",
+            "RENDER_WORKERS": str(render_workers),
+            "OUTPUT_DIR": output_dir,
+            "RESPONSE_CACHE_DIR": "",
+        }
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.coldstart", "--probe"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(
+    repeat: int = 5,
+    warm_ups: List[bool] | None = None,
+    render_workers: List[int] | None = None,
+) -> List[Dict]:
+    warm_ups = WARM_UPS if warm_ups is None else warm_ups
+    render_workers = RENDER_WORKERS if render_workers is None else render_workers
+    results = []
+    for warm_up, workers in product(warm_ups, render_workers):
+        params = {"warm_up": warm_up, "render_workers": workers}
+        timings = {step: [] for step in STEPS}
+        for _ in range(repeat):
+            for step, milliseconds in _run_probe(warm_up, workers).items():
+                timings[step].append(milliseconds)
+        results += [
+            {"suite": "coldstart", "name": step, "params": params, **summarize(values)}
+            for step, values in timings.items()
+        ]
+    return results
+
+
+def main() -> None:
+    if "--probe" in sys.argv:
+        print(json.dumps(probe()))
+        return
+
+    for result in run(repeat=3):
+        print(
+            f"{result['name']:<16} warm_up={result['params']['warm_up']!s:<5} "
+            f"render_workers={result['params']['render_workers']} "
+            f"median {result['median_ms']:9.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+import platform
+import statistics
+import subprocess
+
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Dict, List
+
+
+def measure(func: Callable[[], object], repeat: int = 5, number: int = 1) -> Dict:
+    # One warm-up call, then `repeat` timings of `number` calls each
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((perf_counter() - start) / number * 1000)
+    return summarize(timings, number)
+
+
+def summarize(timings: List[float], number: int = 1) -> Dict:
+    # Timings in milliseconds
+    return {
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "repeat": len(timings),
+        "number": number,
+    }
+
+
+def result_key(result: Dict) -> str:
+    # Identifies the same measurement across result files
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['suite']}:{result['name']}[{params}]"
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    import cv2
+    import numpy
+    import PIL
+    import segno
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": numpy.__version__,
+        "opencv": cv2.__version__,
+        "pillow": PIL.__version__,
+        "segno": segno.__version__,
+    }
+
+
+def write_results(path: str, results: List[Dict]) -> None:
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Dict]:
+    with open(path) as f:
+        return {result_key(result): result for result in json.load(f)["results"]}
@@ -0,0 +1,43 @@
+import argparse
+import sys
+
+from benchmarks.common import load_results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown of the median that counts as a regression",
+    )
+    parser.add_argument("--metric", default="median_ms")
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    candidate = load_results(args.candidate)
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before = baseline[key][args.metric]
+        after = candidate[key][args.metric]
+        change = (after - before) / before if before else 0.0
+        marker = ""
+        if change > args.threshold:
+            marker = "  REGRESSION"
+            regressions += 1
+        print(f"{key}: {before:.3f} -> {after:.3f} ms ({change:+.1%}){marker}")
+
+    for key in sorted(baseline.keys() - candidate.keys()):
+        print(f"{key}: missing in candidate")
+
+    if regressions:
+        print(f"{regressions} regressions above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import base64
+import json
+
+from typing import Dict, List
+
+from benchmarks.common import measure
+from qrgen.encoding import ImageEncoder
+from qrgen.generator import Palette, QRCodeGenerator
+
+TILE_PALETTE = Palette((255, 255, 255), (255, 255, 255), (0, 0, 0), (0, 0, 0))
+
+# (format, compress_level) pairs worth comparing, bmp has no compression
+SETTINGS = [
+    *(("png", level) for level in (0, 1, 3, 6, 9)),
+    ("webp", 0),
+    ("webp", 6),
+    ("bmp", 0),
+    ("tiff", 0),
+    ("tiff", 6),
+]
+
+
+def run(repeat: int = 10, version: int = 4, seed: int = 0) -> List[Dict]:
+    generator = QRCodeGenerator(
+        input_string="https://example.com", version=version, seed=seed
+    )
+    images = generator.generate_qr_codes([TILE_PALETTE, Palette()])
+
+    results = []
+    for image_format, compress_level in SETTINGS:
+        encoder = ImageEncoder(image_format=image_format, compress_level=compress_level)
+        encoded = [encoder.encode_base64(image) for image in images]
+
+        def encode_all():
+            for image in images:
+                encoder.encode_base64(image)
+
+        results.append(
+            {
+                "suite": "encoding",
+                "name": "encode_base64",
+                "params": {
+                    "format": image_format,
+                    "compress_level": compress_level,
+                    "version": version,
+                },
+                **measure(encode_all, repeat=repeat),
+                "bytes": sum(len(base64.b64decode(data)) for data in encoded),
+                "base64_bytes": sum(len(data) for data in encoded),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Encode + base64 time and size of the two control images"
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--version", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args()
+
+    results = run(repeat=args.repeat, version=args.version)
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    print(f"{'format':<8}{'level':>6}{'ms':>10}{'bytes':>10}{'base64':>10}")
+    for r in results:
+        print(
+            f"{r['params']['format']:<8}{r['params']['compress_level']:>6}"
+            f"{r['median_ms']:>10.2f}{r['bytes']:>10}{r['base64_bytes']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
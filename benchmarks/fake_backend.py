@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import base64
+import json
+import random
+
+from io import BytesIO
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+
+class FakeBackendSettings:
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        image_size: int = 768,
+        image_count: int | None = None,
+        concurrency: int = 1,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.image_size = image_size
+        self.image_count = image_count
+        self.concurrency = concurrency
+
+
+def _make_image(size: int) -> str:
+    # Noise compresses about as badly as a real generation does
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size, 3), np.uint8)
+    buffered = BytesIO()
+    Image.fromarray(pixels).save(buffered, format="PNG", compress_level=1)
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def create_app(settings: FakeBackendSettings) -> FastAPI:
+    app = FastAPI()
+    image = _make_image(settings.image_size)
+    # Like Automatic1111, only `concurrency` generations run at a time
+    gpu = asyncio.Semaphore(settings.concurrency)
+
+    async def generate(request: Request) -> JSONResponse:
+        payload = await request.json()
+        count = settings.image_count or payload.get("batch_size", 1) * payload.get(
+            "n_iter", 1
+        )
+
+        async with gpu:
+            latency = settings.latency + random.uniform(0, settings.jitter)
+            await asyncio.sleep(latency)
+
+        if random.random() < settings.failure_rate:
+            return JSONResponse(
+                status_code=500,
+                content={"error": "FakeError", "errors": "Simulated failure."},
+            )
+
+        seed = payload.get("seed", -1)
+        if seed == -1:
+            seed = random.randrange(2**32)
+        info = {
+            "prompt": payload.get("prompt", ""),
+            "seed": seed,
+            "all_seeds": [seed + i for i in range(count)],
+            "all_subseeds": [seed + i for i in range(count)],
+            "all_prompts": [payload.get("prompt", "")] * count,
+            "batch_size": count,
+        }
+        return JSONResponse(
+            {
+                "images": [image] * count,
+                "parameters": {},
+                "info": json.dumps(info),
+            }
+        )
+
+    app.post("/sdapi/v1/img2img")(generate)
+    app.post("/sdapi/v1/txt2img")(generate)
+
+    @app.get("/internal/ping")
+    def ping():
+        return {}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Stable Diffusion backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument(
+        "--latency", type=float, default=1.0, help="seconds per generation"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="extra random latency"
+    )
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, default=768)
+    parser.add_argument(
+        "--image-count", type=int, default=None, help="defaults to the request's"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=1, help="generations running at once"
+    )
+    args = parser.parse_args()
+
+    import uvicorn
+
+    settings = FakeBackendSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        image_size=args.image_size,
+        image_count=args.image_count,
+        concurrency=args.concurrency,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import math
+
+from collections import Counter
+from time import perf_counter
+from typing import Dict, List
+
+import httpx
+
+DEFAULT_REQUEST = {
+    "qr_code_input": "https://example.com",
+    "prompt": "a photo of a castle",
+    "negative_prompt": "blurry",
+}
+
+
+def percentile(values: List[float], q: float) -> float | None:
+    # Nearest rank percentile
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, math.ceil(q / 100 * len(values)) - 1)
+    return values[index]
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    path: str,
+    body: Dict,
+    latencies: List[float],
+    statuses: Counter,
+) -> None:
+    start = perf_counter()
+    try:
+        response = await client.post(path, json=body)
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            latencies.append(perf_counter() - start)
+    except httpx.HTTPError as e:
+        statuses[type(e).__name__] += 1
+
+
+async def run(
+    url: str,
+    rate: float,
+    duration: float,
+    path: str = "/generate_image",
+    body: Dict | None = None,
+    timeout: float = 600.0,
+) -> Dict:
+    # Open loop: requests start on schedule no matter how slow the answers are
+    body = body or DEFAULT_REQUEST
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    total = int(rate * duration)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(
+        base_url=url, timeout=timeout, limits=limits
+    ) as client:
+        start = perf_counter()
+        tasks = []
+        for i in range(total):
+            delay = start + i / rate - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(
+                asyncio.create_task(_send(client, path, body, latencies, statuses))
+            )
+        await asyncio.gather(*tasks)
+        elapsed = perf_counter() - start
+
+    return {
+        "requests": total,
+        "succeeded": len(latencies),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "elapsed_s": round(elapsed, 3),
+        "target_rate": rate,
+        "throughput": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "max_s": max(latencies, default=None),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive the API at a fixed rate")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/generate_image")
+    parser.add_argument("--rate", type=float, default=1.0, help="requests/second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument(
+        "--body", type=json.loads, default=None, help="JSON request body"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        run(
+            args.url,
+            rate=args.rate,
+            duration=args.duration,
+            path=args.path,
+            body=args.body,
+            timeout=args.timeout,
+        )
+    )
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    for key, value in result.items():
+        print(f"{key:<12}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import json
+
+from typing import Dict, List
+
+from benchmarks.common import measure
+from payload.base import Payload
+from payload.controlnet import ControlNetArgs
+from payload.templates import img2img
+from qrgen.encoding import ImageEncoder
+from qrgen.generator import Palette, QRCodeGenerator
+
+TILE_PALETTE = Palette((255, 255, 255), (255, 255, 255), (0, 0, 0), (0, 0, 0))
+
+
+def _build_payload(tile: str, brightness: str) -> Payload:
+    # Same shape as the payload api.generate sends
+    payload = Payload(
+        template=img2img,
+        overwrites={
+            "init_images": [tile],
+            "steps": 22,
+            "width": 768,
+            "height": 768,
+            "n_iter": 1,
+            "batch_size": 1,
+            "seed": -1,
+        },
+    )
+    payload.prompt = "a photo of a castle"
+    payload.negative_prompt = "blurry"
+    payload.add_controlnet(
+        ControlNetArgs(
+            model="control_v11f1e_sd15_tile [a371b31b]",
+            module="tile_resample",
+            weight=0.67,
+            pixel_perfect=True,
+            guidance_start=0.23,
+            guidance_end=0.9,
+            input_image=tile,
+        )
+    )
+    payload.add_controlnet(
+        ControlNetArgs(
+            model="control_v1p_sd15_brightness [5f6aa6ed]",
+            module=None,
+            weight=0.3,
+            pixel_perfect=True,
+            guidance_start=0.5,
+            guidance_end=0.9,
+            input_image=brightness,
+        )
+    )
+    return payload
+
+
+def run(repeat: int = 20) -> List[Dict]:
+    generator = QRCodeGenerator(input_string="https://example.com", seed=0)
+    encoder = ImageEncoder()
+    tile, brightness = (
+        encoder.encode_base64(image)
+        for image in generator.generate_qr_codes([TILE_PALETTE, Palette()])
+    )
+    payload = _build_payload(tile, brightness)
+    body = json.dumps(payload.get())
+
+    params = {"body_bytes": len(body)}
+    stages = {
+        "build": lambda: _build_payload(tile, brightness),
+        "get": payload.get,
+        "serialize": lambda: json.dumps(payload.get()).encode("utf-8"),
+        # What api.generate sends, template members are serialized once
+        "to_json": payload.to_json,
+    }
+    return [
+        {
+            "suite": "payload",
+            "name": name,
+            "params": params,
+            **measure(func, repeat=repeat, number=10),
+        }
+        for name, func in stages.items()
+    ]
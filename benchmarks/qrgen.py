@@ -0,0 +1,103 @@
+import base64
+
+from io import BytesIO
+from itertools import product
+from typing import Dict, Iterable, List
+
+import segno
+
+from benchmarks.common import measure
+from qrgen.generator import QRCodeGenerator
+from qrgen.patterns import MAX_VERSION, MIN_VERSION, get_pattern_mask
+
+# Short enough to fit version 1 at error correction level H
+INPUT_STRING = "HELLO"
+VERSIONS = list(range(MIN_VERSION, MAX_VERSION + 1))
+# PIL can't draw every rounded corner combination below 16 pixels
+PIXEL_SIZES = [16, 32]
+TRANSFORM_AMOUNTS = [0, 2]
+
+
+def _result(name: str, params: Dict, timing: Dict) -> Dict:
+    return {"suite": "qrgen", "name": name, "params": params, **timing}
+
+
+def run_stages(
+    version: int, pixel_size: int, transform_amount: int, repeat: int = 5
+) -> List[Dict]:
+    # Each stage is timed on the output of the previous one, mirroring
+    # generate_qr_code
+    params = {
+        "version": version,
+        "pixel_size": pixel_size,
+        "transform_amount": transform_amount,
+    }
+    generator = QRCodeGenerator(
+        input_string=INPUT_STRING,
+        version=version,
+        pixel_size=pixel_size,
+        transform_amount=transform_amount,
+        seed=0,
+    )
+    generator._encode()
+    code = generator._draw_qr_code_numpy()
+    placed = generator._place_and_transform(code, generator.bg_color)
+    buffered = BytesIO()
+    placed.save(buffered, format="PNG")
+    png = buffered.getvalue()
+
+    def encode_png():
+        placed.save(BytesIO(), format="PNG")
+
+    stages = {
+        "segno_make": lambda: segno.make(INPUT_STRING, error="H", version=version),
+        "pattern_mask": lambda: get_pattern_mask.__wrapped__(version),
+        "draw_numpy": generator._draw_qr_code_numpy,
+        "draw_pil": generator._draw_qr_code_pil,
+        "place_and_transform": lambda: generator._place_and_transform(
+            code, generator.bg_color
+        ),
+        "png_encode": encode_png,
+        "base64": lambda: base64.b64encode(png).decode("utf-8"),
+    }
+    return [
+        _result(name, params, measure(func, repeat=repeat))
+        for name, func in stages.items()
+    ]
+
+
+def run_end_to_end(
+    version: int, pixel_size: int, transform_amount: int, repeat: int = 5
+) -> Dict:
+    params = {
+        "version": version,
+        "pixel_size": pixel_size,
+        "transform_amount": transform_amount,
+    }
+    generator = QRCodeGenerator(
+        input_string=INPUT_STRING,
+        version=version,
+        pixel_size=pixel_size,
+        transform_amount=transform_amount,
+        seed=0,
+    )
+    return _result(
+        "generate_qr_code", params, measure(generator.generate_qr_code, repeat=repeat)
+    )
+
+
+def run(
+    versions: Iterable[int] = VERSIONS,
+    pixel_sizes: Iterable[int] = PIXEL_SIZES,
+    transform_amounts: Iterable[int] = TRANSFORM_AMOUNTS,
+    repeat: int = 5,
+    stages: bool = True,
+) -> List[Dict]:
+    results = []
+    for version, pixel_size, transform_amount in product(
+        versions, pixel_sizes, transform_amounts
+    ):
+        results.append(run_end_to_end(version, pixel_size, transform_amount, repeat))
+        if stages:
+            results += run_stages(version, pixel_size, transform_amount, repeat)
+    return results
@@ -0,0 +1,101 @@
+import os
+
+
+class Settings:
+    # Stable Diffusion (Automatic1111) backend
+    backend_url: str = os.environ.get("SD_BACKEND_URL", "http://localhost:7860")
+    # Comma separated list of backends, defaults to the single backend_url
+    backend_urls: list[str] = [
+        url.strip()
+        for url in os.environ.get("SD_BACKEND_URLS", backend_url).split(",")
+        if url.strip()
+    ]
+    backend_connect_timeout: float = float(
+        os.environ.get("SD_BACKEND_CONNECT_TIMEOUT", 5.0)
+    )
+    backend_read_timeout: float = float(
+        os.environ.get("SD_BACKEND_READ_TIMEOUT", 300.0)
+    )
+    backend_max_connections: int = int(os.environ.get("SD_BACKEND_MAX_CONNECTIONS", 16))
+    backend_max_concurrency: int = int(os.environ.get("SD_BACKEND_MAX_CONCURRENCY", 2))
+    backend_health_path: str = os.environ.get(
+        "SD_BACKEND_HEALTH_PATH", "/internal/ping"
+    )
+    backend_health_interval: float = float(
+        os.environ.get("SD_BACKEND_HEALTH_INTERVAL", 10.0)
+    )
+    backend_max_failures: int = int(os.environ.get("SD_BACKEND_MAX_FAILURES", 3))
+    backend_ejection_time: float = float(
+        os.environ.get("SD_BACKEND_EJECTION_TIME", 30.0)
+    )
+    # Decoded output images of one response spill from memory to disk once
+    # they add up to more than this
+    image_spool_size: int = int(os.environ.get("IMAGE_SPOOL_SIZE", 8 * 1024 * 1024))
+
+    # Micro-batching of compatible requests, a window of 0 disables it
+    batch_window: float = float(os.environ.get("BATCH_WINDOW", 0.0))
+    batch_max_size: int = int(os.environ.get("BATCH_MAX_SIZE", 8))
+
+    # Job queue
+    job_queue_size: int = int(os.environ.get("JOB_QUEUE_SIZE", 64))
+    job_workers: int = int(os.environ.get("JOB_WORKERS", 2))
+    job_result_ttl: float = float(os.environ.get("JOB_RESULT_TTL", 600.0))
+
+    # Control image encoding: png, webp, bmp or tiff at compress level 0-9
+    control_image_format: str = os.environ.get("CONTROL_IMAGE_FORMAT", "png")
+    control_image_compress_level: int = int(
+        os.environ.get("CONTROL_IMAGE_COMPRESS_LEVEL", 1)
+    )
+    # Directory to dump the latest control images to, empty disables it
+    control_image_debug_dir: str = os.environ.get("CONTROL_IMAGE_DEBUG_DIR", "")
+    # Encoded control images are cached up to this many bytes
+    control_image_cache_max_bytes: int = int(
+        os.environ.get("CONTROL_IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+
+    # Adds a Server-Timing header with per-stage durations to every response
+    metrics_timing_header: bool = os.environ.get(
+        "METRICS_TIMING_HEADER", ""
+    ).lower() in ("1", "true", "yes")
+
+    # Import the heavy modules and render once at startup, before the app
+    # reports ready
+    warm_up: bool = os.environ.get("WARM_UP", "true").lower() in ("1", "true", "yes")
+
+    # Pre-warmed worker processes for control images, 0 renders in a thread
+    render_workers: int = int(os.environ.get("RENDER_WORKERS", 2))
+    render_timeout: float = float(os.environ.get("RENDER_TIMEOUT", 30.0))
+
+    # Threads decoding generated images when a scan check is requested
+    verify_workers: int = int(os.environ.get("VERIFY_WORKERS", 4))
+
+    # Bulk QR rendering, defaults to one worker process per CPU
+    bulk_workers: int = int(os.environ.get("BULK_WORKERS", os.cpu_count() or 1))
+    bulk_max_items: int = int(os.environ.get("BULK_MAX_ITEMS", 10000))
+
+    # Output images are written by a background thread pool
+    output_dir: str = os.environ.get("OUTPUT_DIR", "./output")
+    output_writer_workers: int = int(os.environ.get("OUTPUT_WRITER_WORKERS", 2))
+    output_writer_max_pending: int = int(
+        os.environ.get("OUTPUT_WRITER_MAX_PENDING", 32)
+    )
+    # One of "none", "fsync" (each file) or "fsync_dir" (file and directory)
+    output_sync_policy: str = os.environ.get("OUTPUT_SYNC_POLICY", "none")
+
+    # Responses to fixed seed requests, kept in memory and optionally on disk.
+    # An empty directory keeps them in memory only
+    response_cache_max_bytes: int = int(
+        os.environ.get("RESPONSE_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    )
+    response_cache_ttl: float = float(os.environ.get("RESPONSE_CACHE_TTL", 3600.0))
+    response_cache_dir: str = os.environ.get("RESPONSE_CACHE_DIR", "")
+    response_cache_max_disk_bytes: int = int(
+        os.environ.get("RESPONSE_CACHE_MAX_DISK_BYTES", 2 * 1024 * 1024 * 1024)
+    )
+
+    # Parameter sweeps, thumbnails are the tile size on the contact sheet
+    sweep_max_points: int = int(os.environ.get("SWEEP_MAX_POINTS", 64))
+    sweep_thumbnail_size: int = int(os.environ.get("SWEEP_THUMBNAIL_SIZE", 256))
+
+
+settings = Settings()
@@ -0,0 +1,57 @@
+import asyncio
+
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple
+
+
+def bounded_as_completed(
+    items: Iterable, submit: Callable[[Any], Future | None], max_in_flight: int
+) -> Iterator[Tuple[Any, Future | None]]:
+    # Submits items lazily, keeping at most max_in_flight futures pending so
+    # huge inputs don't pile up in memory, and yields (item, future) as they
+    # finish. Items submit returns None for are yielded right away
+    items = iter(items)
+    pending = {}
+    while True:
+        for item in items:
+            future = submit(item)
+            if future is None:
+                yield item, None
+                continue
+            pending[future] = item
+            if len(pending) >= max_in_flight:
+                break
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
+async def async_bounded_as_completed(
+    items: Iterable, submit: Callable[[Any], Awaitable | None], max_in_flight: int
+) -> AsyncIterator[Tuple[Any, asyncio.Future | None]]:
+    # Async version of bounded_as_completed, pending work is cancelled when
+    # the consumer stops early
+    items = iter(items)
+    pending = {}
+    try:
+        while True:
+            for item in items:
+                awaitable = submit(item)
+                if awaitable is None:
+                    yield item, None
+                    continue
+                pending[asyncio.ensure_future(awaitable)] = item
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+
+from collections import OrderedDict
+from enum import Enum
+from time import time
+from typing import Any, Awaitable, Callable, Dict
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job:
+    def __init__(self, request: Any) -> None:
+        self.id = uuid4().hex
+        self.request = request
+        self.status = JobStatus.QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handler: Callable[[Job], Awaitable[Any]],
+        max_size: int = 64,
+        workers: int = 2,
+        result_ttl: float = 600.0,
+    ) -> None:
+        self.handler = handler
+        self.max_size = max_size
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.jobs: Dict[str, Job] = {}
+        self._pending: OrderedDict[str, Job] = OrderedDict()
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=max_size)
+        self._tasks = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._evict_periodically()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, request: Any) -> Job:
+        self.evict_expired()
+
+        job = Job(request)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_size} jobs).")
+
+        self.jobs[job.id] = job
+        self._pending[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def position(self, job: Job) -> int | None:
+        # Number of jobs ahead of this one, None once it left the queue
+        if job.id not in self._pending:
+            return None
+        return list(self._pending).index(job.id)
+
+    def evict_expired(self) -> None:
+        now = time()
+        expired = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.done and now - job.finished_at > self.result_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _evict_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.result_ttl, 60.0))
+            self.evict_expired()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._pending.pop(job.id, None)
+
+            job.status = JobStatus.RUNNING
+            job.started_at = time()
+            try:
+                job.result = await self.handler(job)
+                job.status = JobStatus.SUCCEEDED
+                job.progress = 1.0
+            except asyncio.CancelledError:
+                job.status = JobStatus.FAILED
+                job.error = "Job was cancelled."
+                raise
+            except Exception as e:
+                logger.exception("Job %s failed", job.id)
+                job.status = JobStatus.FAILED
+                job.error = getattr(e, "detail", None) or str(e)
+            finally:
+                job.finished_at = time()
+                self._queue.task_done()
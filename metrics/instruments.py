@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterator
+
+from metrics.registry import Counter, Gauge, Histogram, Registry
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "qrgen_stage_duration_seconds",
+        "Time spent per stage of image generation.",
+        ("stage",),
+    )
+)
+REQUESTS = REGISTRY.register(
+    Counter(
+        "qrgen_http_requests_total",
+        "HTTP requests by route and status code.",
+        ("method", "route", "status"),
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "qrgen_http_request_duration_seconds",
+        "HTTP request latency by route.",
+        ("method", "route"),
+    )
+)
+ERRORS = REGISTRY.register(
+    Counter("qrgen_errors_total", "Failed generations by error type.", ("type",))
+)
+BACKEND_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "qrgen_backend_in_flight",
+        "Calls currently in flight per backend.",
+        ("backend",),
+    )
+)
+RESPONSE_CACHE = REGISTRY.register(
+    Counter(
+        "qrgen_response_cache_total",
+        "Fixed seed generations served from the response cache or the backend.",
+        ("result",),
+    )
+)
+
+# Stage durations of the request being handled, for the timing header
+_request_timings: ContextVar[Dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def record(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, perf_counter() - start)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    # Server-Timing header value, durations in milliseconds
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()
+    )
@@ -0,0 +1,48 @@
+from time import perf_counter
+
+from starlette.datastructures import MutableHeaders
+
+from metrics.instruments import (
+    REQUEST_SECONDS,
+    REQUESTS,
+    server_timing,
+    start_request_timings,
+)
+
+
+class RequestMetricsMiddleware:
+    # Plain ASGI middleware rather than @app.middleware("http"), which wraps
+    # receive and hides client disconnects from the endpoints
+    def __init__(self, app, timing_header: bool = False) -> None:
+        self.app = app
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_request_timings()
+        start = perf_counter()
+        status = 500
+
+        async def send_with_metrics(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_header:
+                    timings["total"] = perf_counter() - start
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(timings))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # Label by route template so job ids don't blow up the label set
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUESTS.inc(method=scope["method"], route=path, status=status)
+            REQUEST_SECONDS.observe(
+                perf_counter() - start, method=scope["method"], route=path
+            )
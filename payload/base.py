@@ -1,9 +1,17 @@
-from typing import Dict, List
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+from types import MappingProxyType
 import json
 import os
 
+from payload.controlnet import ControlNetArgs
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Characters that never need escaping in a JSON string, which covers base64
+PLAIN_STRING_CHARS = (
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+)
+
 # class Payload:
 
 #     def __init__(
@@ -76,26 +84,151 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 #         self.payload["denoising_strength"] = denoising_strength
 
 
+def freeze(value: Any) -> Any:
+    # Read-only view of a template so requests can't write into it
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    # The encoding the backend client uses for json bodies
+    return json.dumps(
+        value, ensure_ascii=False, separators=(",", ":"), allow_nan=False
+    ).encode("utf-8")
+
+
+def _write_string(parts: List[bytes], value: str) -> None:
+    # Base64 images go in as they are instead of through the escaping encoder
+    try:
+        data = value.encode("ascii")
+    except UnicodeEncodeError:
+        parts.append(dumps(value))
+        return
+    if data.translate(None, PLAIN_STRING_CHARS):
+        parts.append(dumps(value))
+        return
+    parts += (b'"', data, b'"')
+
+
+def _write_value(parts: List[bytes], value: Any) -> None:
+    if isinstance(value, str):
+        _write_string(parts, value)
+    elif isinstance(value, (Mapping, ControlNetArgs)):
+        _write_items(parts, value.items())
+    elif isinstance(value, (list, tuple)):
+        parts.append(b"[")
+        for index, item in enumerate(value):
+            if index:
+                parts.append(b",")
+            _write_value(parts, item)
+        parts.append(b"]")
+    else:
+        parts.append(dumps(value))
+
+
+def _write_items(parts: List[bytes], items: Iterable[Tuple[str, Any]]) -> None:
+    parts.append(b"{")
+    for index, (key, value) in enumerate(items):
+        if index:
+            parts.append(b",")
+        parts += (dumps(key), b":")
+        _write_value(parts, value)
+    parts.append(b"}")
+
+
+# Serialized '"key":value' members per template, the template itself is kept
+# so its id can't be reused by another object
+_template_members: Dict[int, Tuple[Mapping, Dict[str, bytes]]] = {}
+
+
+def template_members(template: Mapping) -> Dict[str, bytes]:
+    cached = _template_members.get(id(template))
+    if cached is None:
+        members = {
+            key: dumps(key) + b":" + dumps(thaw(value))
+            for key, value in template.items()
+        }
+        cached = _template_members[id(template)] = (template, members)
+    return cached[1]
+
+
 class Payload:
     prompt: str = ""
     negative_prompt: str = ""
 
-    def __init__(self, template: Dict, overwrites: Dict | None = None) -> None:
-        self.data = template
+    def __init__(self, template: Mapping, overwrites: Dict | None = None) -> None:
+        # Only the per-request values are stored, they are layered over the
+        # frozen template when the payload is built
+        self.template = template
+        self.overwrites = {}
+        self.controlnets = []
 
-        for key, value in overwrites.items():
-            if key in self.data.keys():
+        for key, value in (overwrites or {}).items():
+            if key in self.template.keys():
                 if key == "prompt":
                     self.prompt = value
                 if key == "negative_prompt":
                     self.negative_prompt = value
-                self.data[key] = value
-
-    def get(self):
-        self.data["prompt"] = self.prompt
-        self.data["negative_prompt"] = self.negative_prompt
-
-        return self.data
-
-    def add_controlnet(self, controlnet: Dict):
-        self.data["alwayson_scripts"]["controlnet"]["args"].append(controlnet.payload)
+                self.overwrites[key] = value
+
+    @property
+    def seed(self) -> int:
+        return self.overwrites.get("seed", self.template.get("seed", -1))
+
+    def get(self) -> Dict:
+        data = {key: thaw(value) for key, value in self.template.items()}
+        data.update(self.overwrites)
+        data["prompt"] = self.prompt
+        data["negative_prompt"] = self.negative_prompt
+
+        if self.controlnets:
+            data.setdefault("alwayson_scripts", {})["controlnet"] = {
+                "args": [controlnet.payload for controlnet in self.controlnets]
+            }
+
+        return data
+
+    def to_json(self) -> bytes:
+        # Same bytes as dumps(self.get()), but members left at their template
+        # value are serialized once per template and the body is joined into
+        # a single buffer
+        members = template_members(self.template)
+        values = dict(self.overwrites)
+        values["prompt"] = self.prompt
+        values["negative_prompt"] = self.negative_prompt
+        if self.controlnets:
+            scripts = values.get("alwayson_scripts")
+            if scripts is None:
+                scripts = self.template.get("alwayson_scripts", {})
+            values["alwayson_scripts"] = {
+                **scripts,
+                "controlnet": {"args": self.controlnets},
+            }
+
+        parts = [b"{"]
+        keys = list(self.template.keys())
+        keys += [key for key in values if key not in self.template]
+        for index, key in enumerate(keys):
+            if index:
+                parts.append(b",")
+            if key in values:
+                parts += (dumps(key), b":")
+                _write_value(parts, values[key])
+            else:
+                parts.append(members[key])
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def add_controlnet(self, controlnet: ControlNetArgs):
+        self.controlnets.append(controlnet)
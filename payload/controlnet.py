@@ -1,12 +1,18 @@
+from typing import Any, Dict, Iterator, Tuple
+
+
 class ControlNetArgs:
-    input_image: str = ""
-    module: str | None = None
-    model: str = ""
-    weight: float = 1.0
-    guidance_start: float = 0.0
-    guidance_end: float = 1.0
-    pixel_perfect: bool = False
-    lowvram: bool = False
+    # Field order is the order of the unit in the backend payload
+    __slots__ = (
+        "input_image",
+        "module",
+        "model",
+        "weight",
+        "guidance_start",
+        "guidance_end",
+        "pixel_perfect",
+        "lowvram",
+    )
 
     def __init__(
         self,
@@ -17,6 +23,7 @@ class ControlNetArgs:
         guidance_start: float,
         guidance_end: float,
         pixel_perfect: bool,
+        lowvram: bool = False,
     ) -> None:
         self.input_image = input_image
         self.module = module
@@ -25,16 +32,12 @@ class ControlNetArgs:
         self.guidance_start = guidance_start
         self.guidance_end = guidance_end
         self.pixel_perfect = pixel_perfect
+        self.lowvram = lowvram
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for name in self.__slots__:
+            yield name, getattr(self, name)
 
     @property
-    def payload(self) -> str:
-        return {
-            "input_image": self.input_image,
-            "module": self.module,
-            "model": self.model,
-            "weight": self.weight,
-            "guidance_start": self.guidance_start,
-            "guidance_end": self.guidance_end,
-            "pixel_perfect": self.pixel_perfect,
-            "lowvram": self.lowvram,
-        }
+    def payload(self) -> Dict:
+        return dict(self.items())
@@ -0,0 +1,59 @@
+import math
+
+from itertools import product
+from typing import Dict, List, Mapping, Sequence
+
+# Parameters a sweep can vary and the type their values are cast to
+SWEEP_PARAMETERS = {
+    "steps": int,
+    "denoising_strength": float,
+    "tile_weight": float,
+    "tile_guidance_start": float,
+    "tile_guidance_end": float,
+    "brightness_weight": float,
+    "brightness_guidance_start": float,
+    "brightness_guidance_end": float,
+}
+
+
+def parameter_values(name: str, spec, max_points: int | None = None) -> List:
+    # A list of values, or {"start", "stop", "num"} for evenly spaced values
+    # including both ends. More than max_points values are rejected before
+    # any of them is built
+    if name not in SWEEP_PARAMETERS:
+        raise ValueError(f"Unknown sweep parameter: {name}")
+    kind = SWEEP_PARAMETERS[name]
+
+    if isinstance(spec, Mapping):
+        start, stop, num = spec["start"], spec["stop"], int(spec.get("num", 5))
+        if num < 1:
+            raise ValueError(f"{name} needs at least one value.")
+        if max_points is not None and num > max_points:
+            raise ValueError(f"{name} has {num} values, at most {max_points} allowed.")
+        if num == 1:
+            values = [start]
+        else:
+            values = [start + (stop - start) * i / (num - 1) for i in range(num)]
+    else:
+        values = list(spec)
+        if max_points is not None and len(values) > max_points:
+            raise ValueError(
+                f"{name} has {len(values)} values, at most {max_points} allowed."
+            )
+    if not values:
+        raise ValueError(f"{name} needs at least one value.")
+
+    if kind is int:
+        return [int(round(value)) for value in values]
+    return [round(float(value), 6) for value in values]
+
+
+def expand_grid(parameters: Mapping[str, Sequence], max_points: int) -> List[Dict]:
+    # Every combination, the last parameter varying fastest. The size is
+    # checked before the grid is expanded
+    names = list(parameters)
+    values = [parameter_values(name, parameters[name], max_points) for name in names]
+    size = math.prod(len(options) for options in values)
+    if size > max_points:
+        raise ValueError(f"Sweep has {size} points, at most {max_points} allowed.")
+    return [dict(zip(names, point)) for point in product(*values)]
@@ -1,4 +1,6 @@
-img2img = {
+from payload.base import freeze
+
+_img2img = {
     "template_name": "img2img",
     "init_images": ["brightness_qr.png"],
     "resize_mode": 2,
@@ -40,3 +42,5 @@ img2img = {
     "save_images": False,
     "alwayson_scripts": {"controlnet": {"args": []}},
 }
+
+img2img = freeze(_img2img)
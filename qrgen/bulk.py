@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import sys
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple
+
+from jobs.bounded import async_bounded_as_completed, bounded_as_completed
+from qrgen.encoding import ImageEncoder
+from qrgen.patterns import MAX_VERSION, MIN_VERSION
+from storage.archive import ARCHIVE_FORMATS, ArchiveStream
+
+INPUT_FORMATS = ("jsonl", "csv")
+
+# Per-item generator options and how to read them from CSV strings
+ITEM_OPTIONS = {
+    "version": int,
+    "pixel_size": int,
+    "padding": int,
+    "image_size": int,
+    "transform_amount": int,
+    "code_scale": float,
+    "seed": int,
+    "bg_color": "color",
+    "quiet_color": "color",
+    "module_color": "color",
+    "pattern_color": "color",
+}
+# Allowed ranges, the defaults of the single image endpoint sit inside them.
+# Anything larger could make a worker allocate gigabytes
+ITEM_LIMITS = {
+    "version": (MIN_VERSION, MAX_VERSION),
+    "pixel_size": (16, 32),
+    "padding": (0, 128),
+    "image_size": (64, 2048),
+    "transform_amount": (0, 8),
+    "code_scale": (0.1, 1.0),
+}
+
+
+class BulkItem(NamedTuple):
+    index: int
+    name: str
+    options: Dict
+    error: str | None = None
+
+
+class BulkResult(NamedTuple):
+    item: BulkItem
+    data: bytes | None
+    error: str | None
+
+
+def _parse_color(value) -> tuple:
+    # "#rrggbb", "r,g,b" or a JSON list
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("#") and len(value) == 7:
+            return tuple(int(value[i : i + 2], 16) for i in (1, 3, 5))
+        value = value.split(",")
+    color = tuple(int(channel) for channel in value)
+    if len(color) != 3 or not all(0 <= channel <= 255 for channel in color):
+        raise ValueError(f"Invalid color: {value}")
+    return color
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._ -]", "_", name).strip(" .")[:100]
+
+
+def _make_item(index: int, record: Dict) -> BulkItem:
+    name = _safe_name(str(record.get("name") or "")) or f"{index:06d}"
+    try:
+        if not record.get("input"):
+            raise ValueError("Missing input.")
+        options = {"input_string": str(record["input"])}
+        for key, kind in ITEM_OPTIONS.items():
+            value = record.get(key)
+            if value is None or value == "":
+                continue
+            options[key] = _parse_color(value) if kind == "color" else kind(value)
+            if key in ITEM_LIMITS:
+                low, high = ITEM_LIMITS[key]
+                if not low <= options[key] <= high:
+                    raise ValueError(f"{key} must be between {low} and {high}.")
+    except (TypeError, ValueError) as e:
+        return BulkItem(index, name, {}, str(e))
+    return BulkItem(index, name, options)
+
+
+def parse_items(data: str, input_format: str = "jsonl") -> Iterator[BulkItem]:
+    # Lines that can't be parsed become items carrying their error
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"Unknown input format: {input_format}")
+
+    if input_format == "csv":
+        for index, row in enumerate(csv.DictReader(io.StringIO(data))):
+            yield _make_item(index, row)
+        return
+
+    index = 0
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"input": record}
+            if not isinstance(record, dict):
+                raise ValueError("Expected an object or a string.")
+        except ValueError as e:
+            yield BulkItem(index, f"{index:06d}", {}, f"Invalid JSON: {e}")
+        else:
+            yield _make_item(index, record)
+        index += 1
+
+
+def render_item(options: Dict, image_format: str, compress_level: int) -> bytes:
+    # Runs in the worker processes
+    from qrgen.generator import QRCodeGenerator
+
+    image = QRCodeGenerator(**options).generate_qr_code()
+    encoder = ImageEncoder(image_format=image_format, compress_level=compress_level)
+    return encoder.encode(image)
+
+
+def _submit(executor: Executor, image_format: str, compress_level: int):
+    def submit(item: BulkItem) -> Future | None:
+        if item.error is not None:
+            return None
+        return executor.submit(render_item, item.options, image_format, compress_level)
+
+    return submit
+
+
+def _result(item: BulkItem, future: Future | None) -> BulkResult:
+    if future is None:
+        return BulkResult(item, None, item.error)
+    error = future.exception()
+    if error is None:
+        return BulkResult(item, future.result(), None)
+    return BulkResult(item, None, f"{type(error).__name__}: {error}")
+
+
+def iter_results(
+    items: Iterable[BulkItem],
+    executor: Executor,
+    image_format: str = "png",
+    compress_level: int = 1,
+    max_in_flight: int = 16,
+) -> Iterator[BulkResult]:
+    # Yields results as they finish, keeping at most max_in_flight items
+    # submitted
+    submit = _submit(executor, image_format, compress_level)
+    for item, future in bounded_as_completed(items, submit, max_in_flight):
+        yield _result(item, future)
+
+
+async def aiter_results(
+    items: Iterable[BulkItem],
+    executor: Executor,
+    image_format: str = "png",
+    compress_level: int = 1,
+    max_in_flight: int = 16,
+) -> AsyncIterator[BulkResult]:
+    # Async version of iter_results, pending renders are cancelled when the
+    # consumer stops early
+    loop = asyncio.get_running_loop()
+    submit = _submit(executor, image_format, compress_level)
+
+    def submit_async(item: BulkItem) -> asyncio.Future | None:
+        future = submit(item)
+        return None if future is None else asyncio.wrap_future(future, loop=loop)
+
+    async for item, future in async_bounded_as_completed(
+        items, submit_async, max_in_flight
+    ):
+        yield _result(item, future)
+
+
+class BulkArchive:
+    # Archive of rendered codes, failures become an inline .error.txt entry
+    # and a manifest.jsonl with every item's outcome closes the archive
+    def __init__(self, archive_format: str = "zip", image_format: str = "png") -> None:
+        self.image_format = image_format
+        self.archive = ArchiveStream(archive_format)
+        self.manifest: List[str] = []
+        self.failed = 0
+        self._names = set()
+
+    @property
+    def media_type(self) -> str:
+        return self.archive.media_type
+
+    def _unique_name(self, stem: str, index: int, extension: str) -> str:
+        # Items sharing a name get their index appended
+        name = f"{stem}{extension}"
+        counter = 0
+        while name in self._names:
+            suffix = f"-{index}" if counter == 0 else f"-{index}-{counter}"
+            name = f"{stem}{suffix}{extension}"
+            counter += 1
+        self._names.add(name)
+        return name
+
+    def add(self, result: BulkResult) -> bytes:
+        item = result.item
+        if result.error is None:
+            name = self._unique_name(item.name, item.index, f".{self.image_format}")
+            data = result.data
+        else:
+            name = self._unique_name(item.name, item.index, ".error.txt")
+            data = result.error.encode("utf-8")
+            self.failed += 1
+
+        self.manifest.append(
+            json.dumps(
+                {
+                    "index": item.index,
+                    "file": name,
+                    "ok": result.error is None,
+                    "error": result.error,
+                }
+            )
+        )
+        return self.archive.add(name, data)
+
+    def close(self) -> bytes:
+        manifest = "\n".join(self.manifest).encode("utf-8")
+        return self.archive.add("manifest.jsonl", manifest) + self.archive.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Render one QR code per input line into an archive"
+    )
+    parser.add_argument("input", help="JSONL or CSV file, - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="archive path")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS)
+    parser.add_argument("--archive-format", choices=ARCHIVE_FORMATS)
+    parser.add_argument("--image-format", default="png")
+    parser.add_argument("--compress-level", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    input_format = args.input_format or (
+        "csv" if args.input.endswith(".csv") else "jsonl"
+    )
+    archive_format = args.archive_format or (
+        "tar" if args.output.endswith(".tar") else "zip"
+    )
+    if args.input == "-":
+        data = sys.stdin.read()
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            data = f.read()
+
+    archive = BulkArchive(archive_format, args.image_format)
+    with open(args.output, "wb") as out, ProcessPoolExecutor(args.workers) as pool:
+        for result in iter_results(
+            parse_items(data, input_format),
+            pool,
+            image_format=args.image_format,
+            compress_level=args.compress_level,
+            max_in_flight=args.workers * 2,
+        ):
+            out.write(archive.add(result))
+        out.write(archive.close())
+
+    rendered = len(archive.manifest) - archive.failed
+    print(f"{rendered} rendered, {archive.failed} failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
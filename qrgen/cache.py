@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable
+
+
+def total_length(value) -> int:
+    return sum(len(item) for item in value)
+
+
+class LRUCache:
+    # Least recently used entries go first once the size of the values,
+    # as measured by size_of, exceeds max_bytes
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        size_of: Callable[[Any], int] = total_length,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self.size_of(self._entries.pop(key))
+            self._entries[key] = value
+            self.size += size
+
+            # Evict least recently used entries until we fit again
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self.size_of(evicted)
+
+    def pop(self, key: Hashable) -> Any | None:
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= self.size_of(value)
+            return value
+
+    def get_or_create(self, key: Hashable, create: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_bytes": self.max_bytes,
+            }
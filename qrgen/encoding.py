@@ -0,0 +1,76 @@
+import base64
+import os
+import tempfile
+
+from io import BytesIO
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from metrics.instruments import timed
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Lossless formats the backend can decode; a compress_level of 0 is the fastest
+IMAGE_FORMATS = ("png", "webp", "bmp", "tiff")
+
+
+class ImageEncoder:
+    def __init__(
+        self,
+        image_format: str = "png",
+        compress_level: int = 1,
+        debug_dir: str | None = None,
+    ) -> None:
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {image_format}")
+        if not 0 <= compress_level <= 9:
+            raise ValueError("compress_level has to be between 0 and 9.")
+
+        self.image_format = image_format
+        self.compress_level = compress_level
+        self.debug_dir = debug_dir or None
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.image_format, self.compress_level
+
+    def _save_options(self) -> Dict:
+        if self.image_format == "png":
+            return {"compress_level": self.compress_level}
+        if self.image_format == "webp":
+            # method runs from 0 (fast) to 6 (small)
+            return {
+                "lossless": True,
+                "method": min(self.compress_level, 6),
+                "quality": self.compress_level * 100 // 9,
+            }
+        if self.image_format == "tiff":
+            if self.compress_level == 0:
+                return {}
+            return {"compression": "tiff_adobe_deflate"}
+        return {}
+
+    def encode(self, image: "Image.Image", name: str | None = None) -> bytes:
+        with timed("image_encode"):
+            buffered = BytesIO()
+            image.save(buffered, format=self.image_format, **self._save_options())
+            data = buffered.getvalue()
+        if self.debug_dir is not None and name is not None:
+            self._dump(name, data)
+        return data
+
+    def encode_base64(self, image: "Image.Image", name: str | None = None) -> str:
+        data = self.encode(image, name)
+        with timed("base64_encode"):
+            return base64.b64encode(data).decode("utf-8")
+
+    def _dump(self, name: str, data: bytes) -> None:
+        # Write to a temporary file first so concurrent requests never leave
+        # a half written dump behind
+        os.makedirs(self.debug_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.debug_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(
+            tmp_path, os.path.join(self.debug_dir, f"{name}.{self.image_format}")
+        )
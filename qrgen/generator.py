@@ -1,10 +1,48 @@
 import segno
-from PIL import Image, ImageDraw, ImageOps
-from typing import Union, List
+from PIL import Image, ImageDraw
+from typing import Union, List, Sequence, Tuple
 import random
 import numpy as np
 import cv2
-from itertools import product
+from functools import lru_cache
+
+from metrics.instruments import timed
+from qrgen.geometry import Geometry, build_remap, geometry_cache, get_perspective_matrix
+from qrgen.palette import Palette
+from qrgen.patterns import get_pattern_mask
+
+MODULE_RADIUS = 7
+BACKGROUND, QUIET, MODULE, PATTERN = range(4)
+RENDERERS = ("numpy", "pil")
+CORNER_TILES = [[bool(index >> bit & 1) for bit in range(4)] for index in range(16)]
+
+
+@lru_cache(maxsize=None)
+def _get_module_stamps(pixel_size: int, radius: int) -> np.ndarray:
+    # One tile per combination of label and rounded corners, indexed by
+    # label * 16 + (top_left | top_right << 1 | bottom_right << 2 | bottom_left << 3)
+    # and filled with the label value where the rounded module covers it,
+    # so label 0 gives empty tiles.
+    # Tiles are pixel_size + 1 wide because PIL treats the box as inclusive.
+    tiles = np.zeros((len(CORNER_TILES), pixel_size + 1, pixel_size + 1), np.uint8)
+    for index, corners in enumerate(CORNER_TILES):
+        tile = Image.new(mode="L", size=(pixel_size + 1, pixel_size + 1))
+        ImageDraw.Draw(tile).rounded_rectangle(
+            ((0, 0), (pixel_size, pixel_size)),
+            radius=radius,
+            fill=1,
+            corners=corners,
+        )
+        tiles[index] = np.array(tile)
+
+    stamps = np.concatenate([tiles * label for label in range(PATTERN + 1)])
+    stamps.flags.writeable = False
+    return stamps
+
+
+# Palette that turns a layout into one weight channel per quiet/module/pattern
+# label, so a single warp can be shared by every color variant
+LAYOUT_WEIGHTS = Palette((0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255))
 
 
 class QRCodeGenerator:
@@ -21,7 +59,12 @@ class QRCodeGenerator:
         pattern_color=(0, 0, 0),
         transform_amount=2,
         code_scale=0.85,
+        renderer="numpy",
+        seed=None,
     ):
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer: {renderer}")
+
         self.input_string = input_string
         self.version = version
         self.pixel_size = pixel_size
@@ -33,94 +76,27 @@ class QRCodeGenerator:
         self.pattern_color = pattern_color
         self.transform_amount = transform_amount
         self.code_scale = code_scale
+        self.renderer = renderer
+        self.seed = seed
         self.qrcode = None
         self.matrix = None
         self.pattern_mask = None
+        self.layout = None
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def palette(self) -> Palette:
+        return Palette(
+            self.bg_color, self.quiet_color, self.module_color, self.pattern_color
+        )
 
     def _is_marker(self, x: int, y: int) -> bool:
-        if self.pattern_mask[x][y] == 1:
-            return True
-        return False
-
-    def _is_alignment_within_finder(self, pos, qr_size) -> bool:
-        x, y = pos
-        finder_positions = [(0, 0), (0, qr_size - 7), (qr_size - 7, 0)]
-        alignment_size = 5
-
-        for fp_x, fp_y in finder_positions:
-            if any(
-                (x + i, y + j)
-                in [(fp_x + dx, fp_y + dy) for dx in range(7) for dy in range(7)]
-                for i in range(alignment_size)
-                for j in range(alignment_size)
-            ):
-                return False
-        return True
-
-    def _get_alignment_positions(self):
-        positions = []
-        if self.version > 1:
-            n_patterns = self.version // 7 + 2
-            first_pos = 6
-            positions.append(first_pos)
-            matrix_width = 17 + 4 * self.version
-            last_pos = matrix_width - 1 - first_pos
-            second_last_pos = (
-                (first_pos + last_pos * (n_patterns - 2) + (n_patterns - 1) // 2)
-                // (n_patterns - 1)
-            ) & -2
-            pos_step = last_pos - second_last_pos
-            second_pos = last_pos - (n_patterns - 2) * pos_step
-            positions.extend(range(second_pos, last_pos + 1, pos_step))
-        positions = list(product(positions, repeat=2))
-        positions_clean = []
-        for position in positions:
-            if self._is_alignment_within_finder(position, matrix_width):
-                positions_clean.append(position)
-        return positions_clean
-
-    def _add_finder_pattern(self, mask, x, y):
-        for i in range(7):
-            mask[x + i][y] = 1
-            mask[x + i][y + 6] = 1
-            mask[x][y + i] = 1
-            mask[x + 6][y + i] = 1
-
-        for i in range(2, 5):
-            for j in range(2, 5):
-                mask[x + i][y + j] = 1
-
-    def _add_alignment_pattern(self, mask, x, y):
-        x = x - 2
-        y = y - 2
-        alignment_pattern = [
-            [1, 1, 1, 1, 1],
-            [1, 0, 0, 0, 1],
-            [1, 0, 1, 0, 1],
-            [1, 0, 0, 0, 1],
-            [1, 1, 1, 1, 1],
-        ]
-
-        for i in range(5):
-            for j in range(5):
-                mask[x + i][y + j] = alignment_pattern[i][j]
-
-    def _generate_qr_code_mask(self) -> List[List[int]]:
-        size = self.version * 4 + 17  # Calculate the size of the QR code matrix
-        mask = [[0] * size for _ in range(size)]  # Initialize the matrix with all zeros
-
-        # Add the finder patterns
-        self._add_finder_pattern(mask, 0, 0)
-        self._add_finder_pattern(mask, size - 7, 0)
-        self._add_finder_pattern(mask, 0, size - 7)
-
-        # Add the alignment patterns
-        if self.version >= 2:
-            alignment_coords = self._get_alignment_positions()
-            for coord in alignment_coords:
-                self._add_alignment_pattern(mask, coord[0], coord[1])
-
-        return mask
+        return bool(self.pattern_mask[x, y])
+
+    def _generate_qr_code_mask(self) -> np.ndarray:
+        # Precomputed finder and alignment pattern mask for the version
+        return get_pattern_mask(self.version)
 
     def _get_round_corners(self, x: int, y: int) -> Union[bool, bool, bool, bool]:
         rows = len(self.matrix)
@@ -142,93 +118,61 @@ class QRCodeGenerator:
         top_left = (
             not has_top_neighbor
             and not has_left_neighbor
-            and random.choice([True, False])
+            and self._random.choice([True, False])
         )
         top_right = (
             not has_top_neighbor
             and not has_right_neighbor
-            and random.choice([True, False])
+            and self._random.choice([True, False])
         )
         bottom_right = (
             not has_bottom_neighbor
             and not has_right_neighbor
-            and random.choice([True, False])
+            and self._random.choice([True, False])
         )
         bottom_left = (
             not has_bottom_neighbor
             and not has_left_neighbor
-            and random.choice([True, False])
+            and self._random.choice([True, False])
         )
 
         return [top_left, top_right, bottom_right, bottom_left]
 
-    def _apply_perspective_transform(self, image: Image):
-        width, height = image.size
-
-        # Define the source and destination points for the perspective transformation
-        source_points = np.float32(
-            [
-                (self.padding, self.padding),
-                (width - self.padding, self.padding),
-                (width - self.padding, height - self.padding),
-                (self.padding, height - self.padding),
-            ]
-        )
-        destination_points = np.float32(
-            [
-                (self.padding + self.pixel_size * self.transform_amount, self.padding),
-                (
-                    width - (self.padding + self.pixel_size * self.transform_amount),
-                    self.padding + self.pixel_size * self.transform_amount,
-                ),
-                (
-                    width - self.padding,
-                    height - (self.padding + self.pixel_size * self.transform_amount),
-                ),
-                (self.padding, height - self.padding),
-            ]
-        )
-
-        # Create a perspective transformation matrix
-        perspective_matrix = cv2.getPerspectiveTransform(
-            source_points, destination_points
+    def _get_round_corners_array(self, modules: np.ndarray) -> np.ndarray:
+        # Neighbors of every module at once, treating the outside as empty
+        padded = np.pad(modules, 1)
+        has_top_neighbor = padded[:-2, 1:-1]
+        has_right_neighbor = padded[1:-1, 2:]
+        has_bottom_neighbor = padded[2:, 1:-1]
+        has_left_neighbor = padded[1:-1, :-2]
+
+        # Randomly select the corners to round where both sides have no neighbors
+        choices = self._rng.integers(0, 2, size=(4,) + modules.shape, dtype=np.uint8)
+        top_left = ~has_top_neighbor & ~has_left_neighbor & (choices[0] == 1)
+        top_right = ~has_top_neighbor & ~has_right_neighbor & (choices[1] == 1)
+        bottom_right = ~has_bottom_neighbor & ~has_right_neighbor & (choices[2] == 1)
+        bottom_left = ~has_bottom_neighbor & ~has_left_neighbor & (choices[3] == 1)
+
+        return (
+            top_left.astype(np.uint8)
+            | top_right.astype(np.uint8) << 1
+            | bottom_right.astype(np.uint8) << 2
+            | bottom_left.astype(np.uint8) << 3
         )
 
-        # Apply the perspective transformation using OpenCV
-        transformed_image = cv2.warpPerspective(
-            np.array(image),
-            perspective_matrix,
-            (width, height),
-            borderValue=self.bg_color,
-        )
-
-        # Convert the transformed image to PIL format
-        transformed_image = Image.fromarray(transformed_image)
-
-        # Return the transformed image
-        return transformed_image
-
-    def generate_qr_code(self):
-        # Create QR code and binary mask
-        self.qrcode = segno.make(self.input_string, error="H", version=self.version)
-        self.matrix = self.qrcode.matrix
-
-        # Create image
+    def _draw_qr_code_pil(self, palette: Palette | None = None) -> Image:
+        palette = palette or self.palette
         size = len(self.matrix) * self.pixel_size + 2 * self.padding
-        image = Image.new(mode="RGB", size=(size, size), color=self.quiet_color)
+        image = Image.new(mode="RGB", size=(size, size), color=palette.quiet_color)
         draw = ImageDraw.Draw(image)
 
-        # Generate finder and alignment pattern mask
-        self.pattern_mask = self._generate_qr_code_mask()
-
-        # Draw QR code
         for y, row in enumerate(self.matrix):
             for x, c in enumerate(row):
                 if c == 1:
                     color = (
-                        self.pattern_color
+                        palette.pattern_color
                         if self._is_marker(x, y)
-                        else self.module_color
+                        else palette.module_color
                     )
                     draw.rounded_rectangle(
                         (
@@ -241,26 +185,221 @@ class QRCodeGenerator:
                                 self.padding + y * self.pixel_size + self.pixel_size,
                             ),
                         ),
-                        radius=7,
+                        radius=MODULE_RADIUS,
                         fill=color,
                         corners=self._get_round_corners(x, y),
                     )
 
-        # Scale down the image
-        scaled_down_image = ImageOps.scale(
-            image, (self.image_size / image.width) * self.code_scale
+        return image
+
+    def _draw_qr_code_labels(self) -> np.ndarray:
+        # Label every pixel of the code area with 0 (not covered), MODULE or
+        # PATTERN. Tiles overlap their right and bottom neighbors by one
+        # pixel, so the canvas is stamped as pixel_size blocks first and the
+        # shared seams are then filled in the order the PIL loop paints them.
+        modules = np.array(self.matrix, dtype=bool)
+        n = modules.shape[0]
+        ps = self.pixel_size
+
+        markers = self.pattern_mask.T
+        labels = np.where(modules, np.where(markers, PATTERN, MODULE), 0)
+        corners = self._get_round_corners_array(modules)
+        stamps = _get_module_stamps(ps, MODULE_RADIUS)
+
+        # Pad with an empty ring so every block has a left/top neighbor and the
+        # block past the last module covers the final seam
+        keys = np.pad(labels * len(CORNER_TILES) + corners, 1)
+
+        # The module itself
+        blocks = stamps[keys[1:, 1:], :ps, :ps]
+        canvas = blocks.transpose(0, 2, 1, 3).reshape((n + 1) * ps, (n + 1) * ps)
+        grid = canvas.reshape(n + 1, ps, n + 1, ps)
+
+        # Right column of the left neighbor
+        seam = grid[:, :, :, 0]
+        fill = stamps[keys[1:, :-1], :ps, ps].transpose(0, 2, 1)
+        grid[:, :, :, 0] = np.where(seam == 0, fill, seam)
+
+        # Bottom row of the upper neighbor
+        seam = grid[:, 0]
+        grid[:, 0] = np.where(seam == 0, stamps[keys[:-1, 1:], ps, :ps], seam)
+
+        # Bottom right corner pixel of the upper left neighbor
+        seam = grid[:, 0, :, 0]
+        grid[:, 0, :, 0] = np.where(seam == 0, stamps[keys[:-1, :-1], ps, ps], seam)
+
+        size = n * ps + 1
+        return canvas[:size, :size]
+
+    def _draw_layout(self) -> np.ndarray:
+        labels = self._draw_qr_code_labels()
+
+        size = len(self.matrix) * self.pixel_size + 2 * self.padding
+        layout = np.full((size, size), QUIET, dtype=np.uint8)
+        code_area = layout[self.padding :, self.padding :]
+        code_area = code_area[: labels.shape[0], : labels.shape[1]]
+        np.maximum(
+            labels[: code_area.shape[0], : code_area.shape[1]], QUIET, out=code_area
+        )
+
+        return layout
+
+    def _colorize_layout(self, layout: np.ndarray, palette: Palette) -> Image:
+        image = Image.fromarray(layout)
+        image.putpalette([channel for color in palette for channel in color])
+        return image.convert("RGB")
+
+    def _draw_qr_code_numpy(self) -> Image:
+        return self._colorize_layout(self._draw_layout(), self.palette)
+
+    def _encode(self):
+        # Reseed so every render with a fixed seed gives the same image
+        self._random = random.Random(self.seed)
+        self._rng = np.random.default_rng(self.seed)
+
+        # Create QR code and binary mask
+        self.qrcode = segno.make(self.input_string, error="H", version=self.version)
+        self.matrix = self.qrcode.matrix
+
+        # Generate finder and alignment pattern mask
+        self.pattern_mask = self._generate_qr_code_mask()
+
+    def _build_geometry(self, width: int, height: int) -> Geometry:
+        # Scale down, center and warp composed into one homography
+        factor = (self.image_size / width) * self.code_scale
+        # Same size and offset ImageOps.scale and the centered paste gave
+        scaled_width = max(1, round(width * factor))
+        scaled_height = max(1, round(height * factor))
+        x = (self.image_size - scaled_width) // 2
+        y = (self.image_size - scaled_height) // 2
+
+        # Bilinear sampling aliases below half scale, so large reductions are
+        # box filtered by a whole factor first
+        reduction = int(1 / factor)
+        if reduction > 1:
+            width, height = width // reduction, height // reduction
+
+        # Maps source pixel centers onto the output canvas
+        scale_x = scaled_width / width
+        scale_y = scaled_height / height
+        placement = np.array(
+            [
+                [scale_x, 0, x + 0.5 * scale_x - 0.5],
+                [0, scale_y, y + 0.5 * scale_y - 0.5],
+                [0, 0, 1],
+            ]
         )
-        final_image = Image.new(
-            "RGB", (self.image_size, self.image_size), color=self.bg_color
+        # The perspective matrix only depends on the geometry, so it is shared
+        # between renders
+        perspective_matrix = get_perspective_matrix(
+            self.image_size,
+            self.image_size,
+            self.padding,
+            self.pixel_size,
+            self.transform_amount,
+        )
+        homography = perspective_matrix @ placement
+        map1, map2 = build_remap(homography, self.image_size, self.image_size)
+        return Geometry(max(reduction, 1), homography, map1, map2)
+
+    def _place_and_transform(self, image: Image, bg_color) -> Image:
+        # The remap grids are cached per geometry, so repeat renders only
+        # gather pixels
+        source = np.asarray(image)
+        height, width = source.shape[:2]
+        key = (
+            width,
+            height,
+            self.image_size,
+            self.padding,
+            self.pixel_size,
+            self.transform_amount,
+            self.code_scale,
+        )
+        geometry = geometry_cache.get_or_create(
+            key, lambda: self._build_geometry(width, height)
         )
-        x = (final_image.width - scaled_down_image.width) // 2
-        y = (final_image.height - scaled_down_image.height) // 2
-        final_image.paste(scaled_down_image, (x, y))
 
-        # Apply perspective transform
-        final_image = self._apply_perspective_transform(image=final_image)
+        if geometry.reduction > 1:
+            source = cv2.resize(
+                source,
+                (width // geometry.reduction, height // geometry.reduction),
+                interpolation=cv2.INTER_AREA,
+            )
+
+        transformed_image = cv2.remap(
+            source,
+            geometry.map1,
+            geometry.map2,
+            cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=tuple(bg_color),
+        )
+        return Image.fromarray(transformed_image)
 
-        return final_image
+    def generate_qr_code(self):
+        with timed("qr_encode"):
+            self._encode()
+
+        # Draw QR code
+        with timed("render"):
+            if self.renderer == "pil":
+                image = self._draw_qr_code_pil()
+            else:
+                image = self._draw_qr_code_numpy()
+
+        with timed("warp"):
+            return self._place_and_transform(image, self.bg_color)
+
+    def generate_layout(self) -> np.ndarray:
+        # Encode once and keep the label map of QUIET/MODULE/PATTERN pixels
+        # before scaling, so every color variant shares the same geometry
+        with timed("qr_encode"):
+            self._encode()
+        with timed("render"):
+            self.layout = self._draw_layout()
+        return self.layout
+
+    def generate_qr_codes(self, palettes: Sequence[Palette]) -> List[Image]:
+        if self.renderer == "pil":
+            with timed("qr_encode"):
+                self._encode()
+            with timed("render"):
+                weights = self._draw_qr_code_pil(LAYOUT_WEIGHTS)
+        else:
+            weights = self._colorize_layout(self.generate_layout(), LAYOUT_WEIGHTS)
+
+        # Scale and warp the per-label weights once for all palettes
+        with timed("warp"):
+            weights = self._place_and_transform(weights, LAYOUT_WEIGHTS.bg_color)
+            weights = np.array(weights)
+
+        # Recolor each variant as bg + sum(weight * (color - bg)) per pixel
+        images = []
+        with timed("recolor"):
+            for palette in palettes:
+                bg_color = np.array(palette.bg_color, dtype=np.float32)
+                colors = np.array(palette[1:], dtype=np.float32) - bg_color
+                matrix = np.hstack([colors.T / 255, bg_color[:, None]])
+                images.append(Image.fromarray(cv2.transform(weights, matrix)))
+
+        return images
+
+    def cache_key(self, palettes: Sequence[Palette] | None = None) -> Tuple:
+        # Everything that influences the rendered pixels; only meaningful with
+        # a fixed seed
+        return (
+            self.input_string,
+            self.version,
+            tuple(palettes) if palettes is not None else self.palette,
+            self.pixel_size,
+            self.padding,
+            self.image_size,
+            self.transform_amount,
+            self.code_scale,
+            self.seed,
+            self.renderer,
+        )
 
     def save_qr_code(self, filename):
         qr_code_image = self.generate_qr_code()
@@ -0,0 +1,76 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from qrgen.cache import LRUCache
+
+
+class Geometry(NamedTuple):
+    # Whole factor the source is box filtered by before the remap
+    reduction: int
+    homography: np.ndarray
+    # Fixed point cv2.remap maps from cv2.convertMaps
+    map1: np.ndarray
+    map2: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.homography.nbytes + self.map1.nbytes + self.map2.nbytes
+
+
+@lru_cache(maxsize=256)
+def get_perspective_matrix(
+    width: int, height: int, padding: int, pixel_size: int, transform_amount: int
+) -> np.ndarray:
+    shift = pixel_size * transform_amount
+
+    # Define the source and destination points for the perspective transformation
+    source_points = np.float32(
+        [
+            (padding, padding),
+            (width - padding, padding),
+            (width - padding, height - padding),
+            (padding, height - padding),
+        ]
+    )
+    destination_points = np.float32(
+        [
+            (padding + shift, padding),
+            (width - (padding + shift), padding + shift),
+            (width - padding, height - (padding + shift)),
+            (padding, height - padding),
+        ]
+    )
+
+    matrix = cv2.getPerspectiveTransform(source_points, destination_points)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def build_remap(homography: np.ndarray, width: int, height: int) -> tuple:
+    # The inverse mapping warpPerspective would compute on every call
+    inverse = np.linalg.inv(homography)
+    ys, xs = np.indices((height, width), dtype=np.float64)
+    w = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+    map_x = (inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / w
+    map_y = (inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / w
+    map1, map2 = cv2.convertMaps(
+        map_x.astype(np.float32), map_y.astype(np.float32), cv2.CV_16SC2
+    )
+    map1.flags.writeable = False
+    map2.flags.writeable = False
+    return map1, map2
+
+
+class GeometryCache(LRUCache):
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        super().__init__(max_bytes, size_of=lambda geometry: geometry.nbytes)
+
+    def clear(self) -> None:
+        super().clear()
+        get_perspective_matrix.cache_clear()
+
+
+geometry_cache = GeometryCache()
@@ -0,0 +1,8 @@
+from typing import NamedTuple, Tuple
+
+
+class Palette(NamedTuple):
+    bg_color: Tuple[int, int, int] = (128, 128, 128)
+    quiet_color: Tuple[int, int, int] = (225, 225, 225)
+    module_color: Tuple[int, int, int] = (50, 50, 50)
+    pattern_color: Tuple[int, int, int] = (0, 0, 0)
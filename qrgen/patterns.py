@@ -0,0 +1,93 @@
+from functools import lru_cache
+from itertools import product
+from typing import List, Tuple
+
+import numpy as np
+
+MIN_VERSION = 1
+MAX_VERSION = 40
+
+FINDER_PATTERN = np.array(
+    [
+        [1, 1, 1, 1, 1, 1, 1],
+        [1, 0, 0, 0, 0, 0, 1],
+        [1, 0, 1, 1, 1, 0, 1],
+        [1, 0, 1, 1, 1, 0, 1],
+        [1, 0, 1, 1, 1, 0, 1],
+        [1, 0, 0, 0, 0, 0, 1],
+        [1, 1, 1, 1, 1, 1, 1],
+    ],
+    dtype=bool,
+)
+ALIGNMENT_PATTERN = np.array(
+    [
+        [1, 1, 1, 1, 1],
+        [1, 0, 0, 0, 1],
+        [1, 0, 1, 0, 1],
+        [1, 0, 0, 0, 1],
+        [1, 1, 1, 1, 1],
+    ],
+    dtype=bool,
+)
+
+
+def get_matrix_size(version: int) -> int:
+    return version * 4 + 17
+
+
+def get_alignment_coordinates(version: int) -> List[int]:
+    # Row/column centers of the alignment patterns: the first is always 6,
+    # the rest are evenly spaced from the far edge with an even step
+    if version < 2:
+        return []
+
+    n_patterns = version // 7 + 2
+    last_pos = get_matrix_size(version) - 7
+    if version == 32:
+        step = 26
+    else:
+        step = (version * 4 + n_patterns * 2 + 1) // (2 * n_patterns - 2) * 2
+
+    return [6] + [last_pos - i * step for i in reversed(range(n_patterns - 1))]
+
+
+ALIGNMENT_COORDINATES = {
+    version: get_alignment_coordinates(version)
+    for version in range(MIN_VERSION, MAX_VERSION + 1)
+}
+
+
+def get_alignment_positions(version: int) -> List[Tuple[int, int]]:
+    coordinates = ALIGNMENT_COORDINATES[version]
+    if not coordinates:
+        return []
+
+    # The three combinations that would overlap a finder pattern are skipped
+    first, last = coordinates[0], coordinates[-1]
+    finder_overlaps = {(first, first), (first, last), (last, first)}
+    return [
+        position
+        for position in product(coordinates, repeat=2)
+        if position not in finder_overlaps
+    ]
+
+
+@lru_cache(maxsize=None)
+def get_pattern_mask(version: int) -> np.ndarray:
+    if not MIN_VERSION <= version <= MAX_VERSION:
+        raise ValueError(f"Unsupported QR version: {version}")
+
+    size = get_matrix_size(version)
+    mask = np.zeros((size, size), dtype=bool)
+
+    # Add the finder patterns
+    mask[:7, :7] = FINDER_PATTERN
+    mask[size - 7 :, :7] = FINDER_PATTERN
+    mask[:7, size - 7 :] = FINDER_PATTERN
+
+    # Add the alignment patterns
+    for x, y in get_alignment_positions(version):
+        mask[x - 2 : x + 3, y - 2 : y + 3] = ALIGNMENT_PATTERN
+
+    mask.flags.writeable = False
+    return mask
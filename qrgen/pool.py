@@ -0,0 +1,204 @@
+import asyncio
+import base64
+import logging
+import multiprocessing
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Tuple
+
+from metrics.instruments import record, start_request_timings, timed
+from qrgen.encoding import ImageEncoder
+from qrgen.palette import Palette
+from qrgen.warmup import warm_up
+
+logger = logging.getLogger(__name__)
+
+# Shared by the workers of one executor, see _on_every_worker
+_barrier = None
+
+
+def _init_worker(barrier) -> None:
+    # Runs once per worker so the first real render doesn't pay for
+    # imports, OpenCV initialisation and the module stamp cache
+    global _barrier
+    _barrier = barrier
+    warm_up(ImageEncoder())
+
+
+def _ping() -> None:
+    pass
+
+
+def _on_every_worker(func: Callable[[], Any], timeout: float) -> Any:
+    # A worker that ran func waits for all others, so one submit per worker
+    # reaches every worker exactly once
+    result = func()
+    _barrier.wait(timeout)
+    return result
+
+
+def _geometry_cache_stats() -> Dict[str, int]:
+    from qrgen.geometry import geometry_cache
+
+    return geometry_cache.stats()
+
+
+def _clear_geometry_cache() -> Dict[str, int]:
+    from qrgen.geometry import geometry_cache
+
+    geometry_cache.clear()
+    return geometry_cache.stats()
+
+
+def _render(
+    options: Dict,
+    palettes: Dict[str, Palette],
+    image_format: str,
+    compress_level: int,
+    debug_dir: str | None,
+) -> Tuple[str, List[int], Dict[str, float]]:
+    # Runs in a worker: renders and encodes every palette and hands the
+    # bytes back through one shared memory block instead of pickling them
+    from qrgen.generator import QRCodeGenerator
+
+    timings = start_request_timings()
+    encoder = ImageEncoder(image_format, compress_level, debug_dir)
+    images = QRCodeGenerator(**options).generate_qr_codes(list(palettes.values()))
+    encoded = [encoder.encode(image, name) for name, image in zip(palettes, images)]
+
+    sizes = [len(data) for data in encoded]
+    shm = SharedMemory(create=True, size=sum(sizes))
+    offset = 0
+    for data in encoded:
+        shm.buf[offset : offset + len(data)] = data
+        offset += len(data)
+    name = shm.name
+    shm.close()
+    return name, sizes, timings
+
+
+def _read_shared(name: str, sizes: List[int]) -> List[bytes]:
+    shm = SharedMemory(name=name)
+    try:
+        images = []
+        offset = 0
+        for size in sizes:
+            images.append(bytes(shm.buf[offset : offset + size]))
+            offset += size
+        return images
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _discard(future: Future) -> None:
+    # Frees the shared memory of a render nobody waits for anymore
+    if not future.cancelled() and future.exception() is None:
+        name, _, _ = future.result()
+        shm = SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+
+
+class RenderPool:
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 30.0,
+        encoder: ImageEncoder | None = None,
+    ) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        self.encoder = encoder or ImageEncoder()
+        self._executor = None
+        self._barrier = None
+        self._broadcast_lock = asyncio.Lock()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked, the server process already runs threads
+        context = multiprocessing.get_context("spawn")
+        self._barrier = context.Barrier(self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._barrier,),
+        )
+
+    async def start(self) -> None:
+        self._executor = self._create_executor()
+        # Wait until every worker has started and warmed up
+        await asyncio.gather(
+            *(
+                asyncio.wrap_future(self._executor.submit(_ping))
+                for _ in range(self.workers)
+            )
+        )
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def broadcast(self, func: Callable[[], Any]) -> List:
+        # Runs func once in every worker, busy workers finish their render
+        # first. func has to be a picklable module level function
+        async with self._broadcast_lock:
+            futures = [
+                self._executor.submit(_on_every_worker, func, self.timeout)
+                for _ in range(self.workers)
+            ]
+            try:
+                return await asyncio.gather(
+                    *(asyncio.wrap_future(future) for future in futures)
+                )
+            except BaseException:
+                self._barrier.reset()
+                raise
+
+    async def geometry_cache_stats(self, clear: bool = False) -> Dict:
+        # Every worker warps with its own geometry cache, counts are summed
+        workers = await self.broadcast(
+            _clear_geometry_cache if clear else _geometry_cache_stats
+        )
+        stats = {
+            key: sum(worker[key] for worker in workers)
+            for key in ("hits", "misses", "entries", "size")
+        }
+        return {**stats, "max_bytes": workers[0]["max_bytes"], "workers": workers}
+
+    async def render(
+        self, options: Dict, palettes: Dict[str, Palette]
+    ) -> Tuple[str, ...]:
+        # Palettes are keyed by the name used for debug dumps
+        # Queued work is dropped when the caller is cancelled or times out,
+        # a render that already started finishes and its result is freed
+        try:
+            future = self._executor.submit(
+                _render,
+                options,
+                dict(palettes),
+                self.encoder.image_format,
+                self.encoder.compress_level,
+                self.encoder.debug_dir,
+            )
+        except BrokenProcessPool:
+            logger.warning("Render pool broke, restarting it")
+            self._executor = self._create_executor()
+            raise
+
+        try:
+            with timed("render_pool"):
+                name, sizes, timings = await asyncio.wait_for(
+                    asyncio.wrap_future(future), self.timeout
+                )
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            future.add_done_callback(_discard)
+            raise
+
+        for stage, seconds in timings.items():
+            record(stage, seconds)
+        images = _read_shared(name, sizes)
+        with timed("base64_encode"):
+            return tuple(base64.b64encode(data).decode("utf-8") for data in images)
@@ -0,0 +1,82 @@
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import TYPE_CHECKING, Dict, List, NamedTuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class ScanResult(NamedTuple):
+    decoded: str | None
+    matches: bool
+    # Share of the preprocessed variants that decode to the expected payload
+    confidence: float
+
+    def as_dict(self) -> Dict:
+        return self._asdict()
+
+
+def _variants(gray: "np.ndarray") -> List["np.ndarray"]:
+    import cv2
+
+    # A code that only decodes from the untouched image is a fragile one,
+    # real phone cameras see a smaller, blurrier version of it
+    height, width = gray.shape
+    return [
+        gray,
+        cv2.resize(gray, (width // 2, height // 2), interpolation=cv2.INTER_AREA),
+        cv2.GaussianBlur(gray, (5, 5), 0),
+        cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1],
+    ]
+
+
+def scan_image(data: bytes, expected: str) -> ScanResult:
+    # OpenCV is only loaded once scan checks are actually used
+    import cv2
+    import numpy as np
+
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return ScanResult(None, False, 0.0)
+
+    detector = cv2.QRCodeDetector()
+    decoded = None
+    hits = 0
+    variants = _variants(gray)
+    for variant in variants:
+        value, _, _ = detector.detectAndDecode(variant)
+        if not value:
+            continue
+        if decoded is None or value == expected:
+            decoded = value
+        hits += value == expected
+
+    return ScanResult(decoded, decoded == expected, hits / len(variants))
+
+
+def verify_images(
+    images: List[bytes],
+    expected: str,
+    executor: Executor,
+    required: int = 0,
+) -> List[ScanResult | None]:
+    # Scans images in parallel; with `required` set, stops once that many
+    # scan and leaves the images never checked as None
+    results: List[ScanResult | None] = [None] * len(images)
+    pending = {
+        executor.submit(scan_image, data, expected): index
+        for index, data in enumerate(images)
+    }
+    matches = 0
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                matches += results[index].matches
+            if required and matches >= required:
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+    return results
@@ -0,0 +1,36 @@
+from time import perf_counter
+from typing import Dict, Sequence
+
+from qrgen.encoding import ImageEncoder
+from qrgen.palette import Palette
+
+WARM_UP_INPUT = "warm up"
+
+
+def warm_up(
+    encoder: ImageEncoder,
+    palettes: Sequence[Palette] = (Palette(),),
+    scan: bool = False,
+) -> Dict[str, float]:
+    # Imports the heavy modules and runs one representative render, so the
+    # first request doesn't pay for imports, OpenCV and PIL plugin setup,
+    # the first segno encode or the module stamp cache. Returns seconds per step
+    timings = {}
+    start = perf_counter()
+    from qrgen.generator import QRCodeGenerator
+
+    timings["import"] = perf_counter() - start
+
+    start = perf_counter()
+    generator = QRCodeGenerator(WARM_UP_INPUT, seed=0)
+    images = generator.generate_qr_codes(list(palettes))
+    encoded = [encoder.encode(image) for image in images]
+    timings["render"] = perf_counter() - start
+
+    if scan:
+        from qrgen.verify import scan_image
+
+        start = perf_counter()
+        scan_image(encoded[0], WARM_UP_INPUT)
+        timings["scan"] = perf_counter() - start
+    return timings
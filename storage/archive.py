@@ -0,0 +1,63 @@
+import tarfile
+import time
+import zipfile
+
+from io import BytesIO
+from typing import List
+
+ARCHIVE_FORMATS = ("zip", "tar")
+
+
+class _ChunkBuffer:
+    # Write-only, unseekable sink so the archive modules stream instead of
+    # seeking back, collected bytes are handed out with take()
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArchiveStream:
+    def __init__(self, archive_format: str = "zip") -> None:
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {archive_format}")
+
+        self.archive_format = archive_format
+        self._buffer = _ChunkBuffer()
+        if archive_format == "zip":
+            # Images are already compressed, storing them is much cheaper
+            self._archive = zipfile.ZipFile(self._buffer, "w", zipfile.ZIP_STORED)
+        else:
+            self._archive = tarfile.open(fileobj=self._buffer, mode="w|")
+
+    @property
+    def media_type(self) -> str:
+        return (
+            "application/zip" if self.archive_format == "zip" else "application/x-tar"
+        )
+
+    def add(self, name: str, data: bytes) -> bytes:
+        # Returns the archive bytes produced for this entry
+        if self.archive_format == "zip":
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._archive.addfile(info, BytesIO(data))
+        return self._buffer.take()
+
+    def close(self) -> bytes:
+        self._archive.close()
+        return self._buffer.take()
@@ -0,0 +1,41 @@
+from io import BytesIO
+from typing import List
+
+
+def make_thumbnail(data: bytes, size: int):
+    from PIL import Image
+
+    image = Image.open(BytesIO(data)).convert("RGB")
+    image.thumbnail((size, size))
+    return image
+
+
+def make_contact_sheet(
+    thumbnails: List, labels: List[str], columns: int, size: int = 256
+) -> bytes:
+    # Grid of thumbnails with their label underneath, missing ones (failed
+    # renders) are left gray
+    from PIL import Image, ImageDraw
+
+    line_height = 12
+    label_height = line_height * max(label.count("\n") + 1 for label in labels) + 8
+    rows = -(-len(thumbnails) // columns)
+    sheet = Image.new(
+        "RGB", (columns * size, rows * (size + label_height)), (255, 255, 255)
+    )
+    draw = ImageDraw.Draw(sheet)
+    for index, (thumbnail, label) in enumerate(zip(thumbnails, labels)):
+        x = index % columns * size
+        y = index // columns * (size + label_height)
+        if thumbnail is None:
+            draw.rectangle((x, y, x + size - 1, y + size - 1), fill=(200, 200, 200))
+        else:
+            sheet.paste(
+                thumbnail,
+                (x + (size - thumbnail.width) // 2, y + (size - thumbnail.height) // 2),
+            )
+        draw.multiline_text((x + 4, y + size + 4), label, fill=(0, 0, 0), spacing=2)
+
+    buffered = BytesIO()
+    sheet.save(buffered, format="PNG", compress_level=1)
+    return buffered.getvalue()
@@ -0,0 +1,40 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def make_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+def make_text_chunk(key: str, value: str) -> bytes:
+    # Same choice as PIL's PngInfo.add_text: tEXt when the value fits in
+    # latin-1, an uncompressed iTXt chunk otherwise
+    try:
+        return make_chunk(
+            b"tEXt", key.encode("latin-1") + b"\0" + value.encode("latin-1")
+        )
+    except UnicodeEncodeError:
+        return make_chunk(
+            b"iTXt",
+            # keyword, no compression, empty language tag and translated keyword
+            key.encode("latin-1") + b"\0" + b"\0\0" + b"\0\0" + value.encode("utf-8"),
+        )
+
+
+def add_text_chunk(png: bytes, key: str, value: str) -> bytes:
+    # Insert a text chunk right after IHDR without touching the image data
+    if not png.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG image.")
+    (ihdr_length,) = struct.unpack(">I", png[8:12])
+    if png[12:16] != b"IHDR":
+        raise ValueError("PNG image does not start with IHDR.")
+
+    insert_at = 8 + 12 + ihdr_length
+    return b"".join((png[:insert_at], make_text_chunk(key, value), png[insert_at:]))
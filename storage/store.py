@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+
+from threading import Lock
+from time import time
+from typing import Dict, List, NamedTuple
+
+from storage.png import add_text_chunk
+
+SYNC_POLICIES = ("none", "fsync", "fsync_dir")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    media_type TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image_id TEXT NOT NULL REFERENCES images (id),
+    position INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    negative_prompt TEXT NOT NULL,
+    seed INTEGER,
+    parameters TEXT NOT NULL,
+    info TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_image_id ON outputs (image_id);
+CREATE INDEX IF NOT EXISTS outputs_created_at ON outputs (created_at);
+CREATE INDEX IF NOT EXISTS outputs_seed ON outputs (seed);
+"""
+
+# Magic bytes of the formats the backend can return
+MEDIA_TYPES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"RIFF", "image/webp", ".webp"),
+)
+
+
+class StoredImage(NamedTuple):
+    id: str
+    path: str
+    size: int
+    media_type: str
+    created_at: float
+
+
+class OutputRecord(NamedTuple):
+    # One generated output, several can point at the same stored image
+    prompt: str
+    negative_prompt: str
+    seed: int | None
+    parameters: Dict
+    info: str
+    position: int = 0
+
+
+def content_id(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _media_type(data: bytes) -> tuple[str, str]:
+    for magic, media_type, extension in MEDIA_TYPES:
+        if data.startswith(magic):
+            return media_type, extension
+    return "application/octet-stream", ".bin"
+
+
+class OutputStore:
+    # Images are stored once under their SHA-256 in two levels of shard
+    # directories, an SQLite index keeps every output that produced them
+    def __init__(self, directory: str = "./output", sync_policy: str = "none") -> None:
+        if sync_policy not in SYNC_POLICIES:
+            raise ValueError(f"Unknown sync policy: {sync_policy}")
+
+        self.directory = directory
+        self.sync_policy = sync_policy
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = Lock()
+
+    def path(self, image_id: str, extension: str) -> str:
+        return os.path.join(
+            self.directory, "objects", image_id[:2], image_id[2:4], image_id + extension
+        )
+
+    def put(
+        self, data: bytes, record: OutputRecord, image_id: str | None = None
+    ) -> str:
+        # The id covers the image as the backend sent it. The info differs
+        # between runs (job_timestamp), so the parameters chunk the stored
+        # PNG carries is the one of the first output and not part of the id
+        image_id = image_id or content_id(data)
+        media_type, extension = _media_type(data)
+        now = time()
+
+        # Identical images are only written the first time
+        size = len(data)
+        if self.get(image_id) is None:
+            if media_type == "image/png":
+                data = add_text_chunk(data, "parameters", record.info)
+            size = self._write_file(self.path(image_id, extension), data)
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?)",
+                    (image_id, size, media_type, now),
+                )
+                self._db.execute(
+                    "INSERT INTO outputs (image_id, position, prompt, negative_prompt,"
+                    " seed, parameters, info, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        image_id,
+                        record.position,
+                        record.prompt,
+                        record.negative_prompt,
+                        record.seed,
+                        json.dumps(record.parameters),
+                        record.info,
+                        now,
+                    ),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return image_id
+
+    def _write_file(self, path: str, data: bytes) -> int:
+        # Written to a temporary file first, a file under its final name is
+        # always complete. The first write wins, so a stored file never
+        # changes once it exists. Returns the size of the stored file
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if self.sync_policy != "none":
+                    f.flush()
+                    os.fsync(f.fileno())
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp_path)
+
+        if self.sync_policy == "fsync_dir":
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        return os.path.getsize(path)
+
+    def get(self, image_id: str) -> StoredImage | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM images WHERE id = ?", (image_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        extension = next(
+            (
+                ext
+                for _, media_type, ext in MEDIA_TYPES
+                if media_type == row["media_type"]
+            ),
+            ".bin",
+        )
+        return StoredImage(
+            row["id"],
+            self.path(row["id"], extension),
+            row["size"],
+            row["media_type"],
+            row["created_at"],
+        )
+
+    def outputs(
+        self,
+        image_id: str | None = None,
+        prompt: str | None = None,
+        seed: int | None = None,
+        before: int | None = None,
+        limit: int = 50,
+    ) -> List[Dict]:
+        # Newest first, before is the output id to continue after
+        conditions, arguments = [], []
+        if image_id is not None:
+            conditions.append("image_id = ?")
+            arguments.append(image_id)
+        if prompt:
+            conditions.append("prompt LIKE ? ESCAPE '\\'")
+            escaped = (
+                prompt.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            )
+            arguments.append(f"%{escaped}%")
+        if seed is not None:
+            conditions.append("seed = ?")
+            arguments.append(seed)
+        if before is not None:
+            conditions.append("id < ?")
+            arguments.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM outputs {where} ORDER BY id DESC LIMIT ?",
+                (*arguments, limit),
+            ).fetchall()
+        return [
+            {**dict(row), "parameters": json.loads(row["parameters"])} for row in rows
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            images, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images"
+            ).fetchone()
+            outputs = self._db.execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+        return {"images": images, "outputs": outputs, "size": size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
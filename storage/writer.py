@@ -0,0 +1,61 @@
+import logging
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Dict
+
+from metrics.instruments import timed
+from storage.store import OutputRecord, OutputStore, content_id
+
+logger = logging.getLogger(__name__)
+
+
+class OutputWriter:
+    def __init__(
+        self,
+        store: OutputStore,
+        max_workers: int = 2,
+        max_pending: int = 32,
+    ) -> None:
+        self.store = store
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="output-writer"
+        )
+        # Blocks producers once max_pending writes are queued
+        self._pending = BoundedSemaphore(max_pending)
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = Lock()
+
+    def submit(self, data: bytes, record: OutputRecord) -> str:
+        # Returns the image id right away, the write happens in the background
+        image_id = content_id(data)
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(self._write, data, record, image_id)
+        except BaseException:
+            self._pending.release()
+            raise
+        with self._lock:
+            self._in_flight[image_id] = future
+        future.add_done_callback(lambda future: self._done(image_id, future))
+        return image_id
+
+    def in_flight(self, image_id: str) -> Future | None:
+        # Lets readers wait for an image that was handed out but not written
+        with self._lock:
+            return self._in_flight.get(image_id)
+
+    def _done(self, image_id: str, future: Future) -> None:
+        self._pending.release()
+        with self._lock:
+            if self._in_flight.get(image_id) is future:
+                del self._in_flight[image_id]
+        if future.exception() is not None:
+            logger.error("Failed to write output", exc_info=future.exception())
+
+    def _write(self, data: bytes, record: OutputRecord, image_id: str) -> str:
+        with timed("disk_save"):
+            return self.store.put(data, record, image_id)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,170 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.client import BackendClient
+from backend.dispatcher import BackendDispatcher
+from benchmarks.fake_backend import FakeBackendSettings, create_app
+
+PATH = "/sdapi/v1/img2img"
+PAYLOAD = {"prompt": "p", "seed": 1, "batch_size": 1}
+
+
+class StandIn(httpx.AsyncBaseTransport):
+    # Counts generation calls and fails on demand, otherwise answers like
+    # the fake backend. down refuses every connection, status answers
+    # generations with that status code
+    def __init__(self, latency: float = 0.0) -> None:
+        settings = FakeBackendSettings(latency=latency, image_size=8, concurrency=8)
+        self.app = httpx.ASGITransport(app=create_app(settings))
+        self.calls = 0
+        self.down = False
+        self.status = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.down:
+            raise httpx.ConnectError("Connection refused", request=request)
+        if request.url.path == PATH:
+            self.calls += 1
+            if self.status is not None:
+                return httpx.Response(self.status, json={"error": "Unavailable"})
+        return await self.app.handle_async_request(request)
+
+
+def make_dispatcher(*stand_ins: StandIn, **options) -> BackendDispatcher:
+    clients = []
+    for index, stand_in in enumerate(stand_ins):
+        url = f"http://backend-{index}"
+        client = BackendClient(url, max_concurrency=8)
+        client.client = httpx.AsyncClient(base_url=url, transport=stand_in)
+        clients.append(client)
+    return BackendDispatcher(clients, health_interval=3600, **options)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_least_outstanding_backend_is_picked():
+    first, second = StandIn(latency=0.1), StandIn(latency=0.1)
+
+    async def scenario():
+        dispatcher = make_dispatcher(first, second)
+        await dispatcher.start()
+        responses = await asyncio.gather(
+            *(dispatcher.post(PATH, json=PAYLOAD) for _ in range(6))
+        )
+        await dispatcher.close()
+        return responses
+
+    responses = run(scenario())
+    assert [response.status_code for response in responses] == [200] * 6
+    assert (first.calls, second.calls) == (3, 3)
+
+
+@pytest.mark.parametrize("failure", ["down", "status"])
+def test_failing_backend_fails_over_and_is_ejected(failure):
+    failing, healthy = StandIn(), StandIn()
+
+    async def scenario():
+        dispatcher = make_dispatcher(failing, healthy, max_failures=2)
+        await dispatcher.start()
+        if failure == "down":
+            failing.down = True
+        else:
+            failing.status = 503
+        responses = [await dispatcher.post(PATH, json=PAYLOAD) for _ in range(6)]
+        status = dispatcher.status()
+        await dispatcher.close()
+        return responses, status
+
+    responses, status = run(scenario())
+    assert [response.status_code for response in responses] == [200] * 6
+    assert healthy.calls == 6
+    # Tried until it reached max_failures, skipped once ejected
+    if failure == "status":
+        assert failing.calls == 2
+    assert status[0]["ejected"] and not status[1]["ejected"]
+
+
+def test_stream_fails_over():
+    failing, healthy = StandIn(), StandIn()
+    failing.status = 503
+
+    async def scenario():
+        dispatcher = make_dispatcher(failing, healthy)
+        await dispatcher.start()
+        statuses = []
+        for _ in range(2):
+            async with dispatcher.stream(PATH, json=PAYLOAD) as response:
+                await response.aread()
+                statuses.append(response.status_code)
+        await dispatcher.close()
+        return statuses
+
+    assert run(scenario()) == [200, 200]
+    assert healthy.calls == 2
+
+
+def test_ejected_backend_is_readmitted():
+    flaky, healthy = StandIn(), StandIn()
+
+    async def scenario():
+        dispatcher = make_dispatcher(flaky, healthy, max_failures=1, ejection_time=0.2)
+        await dispatcher.start()
+        flaky.down = True
+        # Ties rotate, so one of two calls tries the flaky backend first
+        for _ in range(2):
+            await dispatcher.post(PATH, json=PAYLOAD)
+        ejected = dispatcher.status()[0]["ejected"]
+
+        flaky.down = False
+        await asyncio.sleep(0.25)
+        await dispatcher.check_health()
+        await asyncio.gather(*(dispatcher.post(PATH, json=PAYLOAD) for _ in range(4)))
+        status = dispatcher.status()
+        await dispatcher.close()
+        return ejected, status
+
+    ejected, status = run(scenario())
+    assert ejected
+    assert not status[0]["ejected"] and status[0]["healthy"]
+    assert flaky.calls >= 2
+
+
+def test_unhealthy_backend_is_skipped_until_it_recovers():
+    sick, healthy = StandIn(), StandIn()
+
+    async def scenario():
+        dispatcher = make_dispatcher(sick, healthy)
+        sick.down = True
+        await dispatcher.start()
+        sick.down = False
+        for _ in range(3):
+            await dispatcher.post(PATH, json=PAYLOAD)
+        calls_while_unhealthy = sick.calls
+
+        await dispatcher.check_health()
+        await asyncio.gather(*(dispatcher.post(PATH, json=PAYLOAD) for _ in range(4)))
+        await dispatcher.close()
+        return calls_while_unhealthy
+
+    assert run(scenario()) == 0
+    assert sick.calls > 0
+
+
+def test_all_backends_down_raises():
+    first, second = StandIn(), StandIn()
+
+    async def scenario():
+        dispatcher = make_dispatcher(first, second)
+        await dispatcher.start()
+        first.down = second.down = True
+        try:
+            await dispatcher.post(PATH, json=PAYLOAD)
+        finally:
+            await dispatcher.close()
+
+    with pytest.raises(httpx.ConnectError):
+        run(scenario())
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+import pytest
+
+from PIL import Image, ImageOps
+
+from qrgen.generator import QRCodeGenerator
+
+
+class FixedCorners:
+    # Stands in for both random sources so the PIL loop and the NumPy
+    # renderer round the same corners
+    def __init__(self, rounded: bool) -> None:
+        self.rounded = rounded
+
+    def choice(self, options):
+        return self.rounded
+
+    def integers(self, low, high, size, dtype):
+        return np.full(size, int(self.rounded), dtype=dtype)
+
+
+def place_and_transform_reference(generator: QRCodeGenerator, image: Image):
+    # The original pipeline: ImageOps.scale, a centered paste and a separate
+    # warpPerspective of the whole canvas
+    size = generator.image_size
+    scaled = ImageOps.scale(image, (size / image.width) * generator.code_scale)
+    canvas = Image.new("RGB", (size, size), color=generator.bg_color)
+    canvas.paste(scaled, ((size - scaled.width) // 2, (size - scaled.height) // 2))
+
+    padding = generator.padding
+    shift = generator.pixel_size * generator.transform_amount
+    matrix = cv2.getPerspectiveTransform(
+        np.float32(
+            [
+                (padding, padding),
+                (size - padding, padding),
+                (size - padding, size - padding),
+                (padding, size - padding),
+            ]
+        ),
+        np.float32(
+            [
+                (padding + shift, padding),
+                (size - (padding + shift), padding + shift),
+                (size - padding, size - (padding + shift)),
+                (padding, size - padding),
+            ]
+        ),
+    )
+    return cv2.warpPerspective(
+        np.array(canvas), matrix, (size, size), borderValue=generator.bg_color
+    )
+
+
+@pytest.mark.parametrize("rounded", [False, True])
+@pytest.mark.parametrize("version", [1, 4, 10, 25])
+@pytest.mark.parametrize("pixel_size", [16, 17, 24])
+def test_numpy_renderer_matches_pil(rounded, version, pixel_size):
+    images = []
+    for renderer in ("pil", "numpy"):
+        generator = QRCodeGenerator(
+            "HELLO", version=version, pixel_size=pixel_size, renderer=renderer
+        )
+        generator._encode()
+        generator._random = generator._rng = FixedCorners(rounded)
+        if renderer == "pil":
+            images.append(np.array(generator._draw_qr_code_pil()))
+        else:
+            images.append(np.array(generator._draw_qr_code_numpy()))
+
+    assert np.array_equal(images[0], images[1])
+
+
+@pytest.mark.parametrize("version", [1, 4, 10, 25, 40])
+@pytest.mark.parametrize("pixel_size", [16, 32])
+def test_single_warp_stays_close_to_original_pipeline(version, pixel_size):
+    generator = QRCodeGenerator("HELLO", version=version, pixel_size=pixel_size, seed=0)
+    generator._encode()
+    image = generator._draw_qr_code_numpy()
+
+    expected = place_and_transform_reference(generator, image).astype(np.float32)
+    actual = generator._place_and_transform(image, generator.bg_color)
+    actual = np.array(actual).astype(np.float32)
+
+    assert actual.shape == expected.shape
+    assert np.abs(actual - expected).mean() < 7
+    # Edges may move by a fraction of a pixel, compare after a 1px blur
+    blurred = np.abs(cv2.blur(actual, (3, 3)) - cv2.blur(expected, (3, 3)))
+    assert np.percentile(blurred, 99) < 17
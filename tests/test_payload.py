@@ -0,0 +1,60 @@
+import base64
+import json
+
+from payload.base import Payload, dumps
+from payload.controlnet import ControlNetArgs
+from payload.templates import img2img
+
+IMAGE = base64.b64encode(bytes(range(256)) * 64).decode("ascii")
+
+
+def make_payload(seed: int) -> Payload:
+    payload = Payload(
+        template=img2img,
+        overwrites={"init_images": [IMAGE], "seed": seed, "steps": 20},
+    )
+    payload.prompt = "a city at night"
+    payload.negative_prompt = "blurry"
+    payload.add_controlnet(
+        ControlNetArgs(
+            input_image=IMAGE,
+            module="tile_resample",
+            model="control_v11f1e_sd15_tile [a371b31b]",
+            weight=0.67,
+            guidance_start=0.23,
+            guidance_end=0.9,
+            pixel_perfect=True,
+        )
+    )
+    payload.add_controlnet(
+        ControlNetArgs(
+            input_image=IMAGE,
+            module="none",
+            model="control_v1p_sd15_brightness [5f6aa6ed]",
+            weight=0.3,
+            guidance_start=0.5,
+            guidance_end=0.9,
+            pixel_perfect=True,
+        )
+    )
+    return payload
+
+
+def test_payload_size_stays_flat():
+    sizes = {len(make_payload(seed=1000).to_json()) for _ in range(100)}
+    assert len(sizes) == 1
+    assert len(img2img["alwayson_scripts"]["controlnet"]["args"]) == 0
+
+
+def test_payload_has_only_its_own_controlnets():
+    for seed in range(1000, 1010):
+        data = make_payload(seed).get()
+        assert len(data["alwayson_scripts"]["controlnet"]["args"]) == 2
+        assert data["seed"] == seed
+    assert len(img2img["alwayson_scripts"]["controlnet"]["args"]) == 0
+
+
+def test_to_json_matches_get():
+    payload = make_payload(seed=7)
+    assert payload.to_json() == dumps(payload.get())
+    assert json.loads(payload.to_json()) == payload.get()
@@ -0,0 +1,110 @@
+import asyncio
+import base64
+import json
+import os
+
+import httpx
+import pytest
+
+from backend.streaming import ImageStreamParser, read_images
+
+IMAGES = [os.urandom(size) for size in (0, 1, 2, 3, 57, 300)]
+
+
+def make_body(images=IMAGES, escape_slashes=False) -> bytes:
+    info = {
+        "prompt": 'quote " and \\ backslash, {braces} [brackets]',
+        "all_seeds": [1, 2, 3],
+        "extra": {"nested": [{"a": "b"}, [], {}], "unicode": "é☃"},
+    }
+    body = json.dumps(
+        {
+            "parameters": {"init_images": ["ignored"], "nested": {"x": [1, {"y": 2}]}},
+            "images": [base64.b64encode(image).decode("ascii") for image in images],
+            "info": json.dumps(info),
+            "number": -1.5e3,
+            "flag": True,
+            "nothing": None,
+        },
+        indent=1,
+    )
+    if escape_slashes:
+        body = body.replace("/", "\\/")
+    return body.encode("utf-8")
+
+
+def parse(chunks):
+    parser = ImageStreamParser()
+    images = []
+    for chunk in chunks:
+        for event, data in parser.feed(chunk):
+            if event == "start":
+                images.append(b"")
+            elif event == "data":
+                images[-1] += data
+    return parser, images
+
+
+@pytest.mark.parametrize("escape_slashes", [False, True])
+def test_every_split_offset(escape_slashes):
+    body = make_body(escape_slashes=escape_slashes)
+    expected_info = json.loads(body)["info"]
+    for offset in range(len(body) + 1):
+        parser, images = parse([body[:offset], body[offset:]])
+        assert parser.done
+        assert images == IMAGES
+        assert parser.fields == {"info": expected_info}
+
+
+def test_byte_by_byte():
+    body = make_body(escape_slashes=True)
+    parser, images = parse([body[i : i + 1] for i in range(len(body))])
+    assert parser.done
+    assert images == IMAGES
+    assert json.loads(parser.fields["info"])["extra"]["unicode"] == "é☃"
+
+
+def test_truncated_body_is_not_done():
+    body = make_body()
+    for offset in range(0, len(body), 7):
+        parser, _ = parse([body[:offset]])
+        assert not parser.done
+
+
+def test_not_an_object():
+    with pytest.raises(ValueError):
+        parse([b"[1, 2]"])
+
+
+def read(body: bytes, limit: int = 100, spool_size: int = 8 * 1024 * 1024):
+    async def scenario():
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=body)
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.get("http://backend/")
+            return await read_images(response, limit=limit, spool_size=spool_size)
+
+    return asyncio.run(scenario())
+
+
+def test_read_images_limit():
+    images, fields = read(make_body(), limit=2)
+    assert [image.read() for image in images] == IMAGES[:2]
+    assert "info" in fields
+
+
+def test_read_images_truncated_body():
+    body = make_body()
+    with pytest.raises(ValueError):
+        read(body[: len(body) // 2])
+
+
+def test_spool_budget_covers_the_whole_response():
+    image = os.urandom(100_000)
+    body = make_body(images=[image] * 6)
+    images, _ = read(body, spool_size=250_000)
+
+    # Two images fit the budget, the third crosses it and the rest spill
+    assert [image._rolled for image in images] == [False, False] + [True] * 4
+    assert all(spooled.read() == image for spooled in images)
@@ -0,0 +1,55 @@
+from time import perf_counter
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+import api
+from payload.sweep import expand_grid, parameter_values
+
+
+def test_parameter_values_range_includes_both_ends():
+    values = parameter_values(
+        "denoising_strength", {"start": 0.2, "stop": 0.6, "num": 3}
+    )
+    assert values == [0.2, 0.4, 0.6]
+    assert parameter_values("steps", [10.4, 19.6]) == [10, 20]
+
+
+def test_expand_grid_varies_last_parameter_fastest():
+    grid = expand_grid({"steps": [10, 20], "tile_weight": [0.5, 0.6]}, max_points=4)
+    assert grid == [
+        {"steps": 10, "tile_weight": 0.5},
+        {"steps": 10, "tile_weight": 0.6},
+        {"steps": 20, "tile_weight": 0.5},
+        {"steps": 20, "tile_weight": 0.6},
+    ]
+
+
+@pytest.mark.parametrize("num", [65, 10**7, 10**12])
+def test_oversized_range_is_rejected_before_it_is_built(num):
+    start = perf_counter()
+    with pytest.raises(ValueError):
+        parameter_values("steps", {"start": 1, "stop": 50, "num": num}, max_points=64)
+    assert perf_counter() - start < 0.1
+
+
+def test_oversized_grid_is_rejected():
+    with pytest.raises(ValueError):
+        expand_grid({"steps": [1] * 10, "tile_weight": [0.5] * 10}, max_points=64)
+
+
+def test_sweep_endpoint_rejects_oversized_num_fast():
+    client = TestClient(api.app)
+    start = perf_counter()
+    response = client.post(
+        "/sweep",
+        json={
+            "qr_code_input": "x",
+            "prompt": "p",
+            "negative_prompt": "",
+            "parameters": {"steps": {"start": 1, "stop": 50, "num": 10**9}},
+        },
+    )
+    assert response.status_code == 400
+    assert perf_counter() - start < 1